@@ -1,10 +1,49 @@
 import pandas as pd
 import os
+import sys
+
+# The narrative store format is defined once, next to the app that reads it (narrative_store.py only needs numpy)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jbi100_app_streamlit'))
+from narrative_store import write_narratives
 
 SPARSENESS_THRESHOLD = 0.99 # All columns where there are (SPARSENESS_THRESHOLD * 100)% n/a values will be dropped
 NEW_DATA_ONLY = True # If True, all data entries preceding 2011 will be dropped
 DROP_0_COORD = True # If True, all data entries with coordinates 0,0 will be dropped
 
+# Explicit column types of the binary snapshot, so that the app does not have to re-infer them.
+# Columns that are not listed keep their type, except text columns which are stored as strings.
+# Types follow Form_54_Data_Dictionary.xlsx. The code columns (STATE, TYPE, VISIBLTY, WEATHER, TYPTRK) are
+# "text" there but only hold numeric codes, which the app compares as numbers.
+SNAPSHOT_SCHEMA = {
+    'DATETIME': 'datetime64[ns]',
+    'YEAR': 'int64',
+    'MONTH': 'int64',
+    'DAY': 'int64',
+    'Latitude': 'float64',
+    'Longitude': 'float64',
+    'STATE': 'float64',
+    'TYPE': 'float64',
+    'VISIBLTY': 'float64',
+    'WEATHER': 'float64',
+    'TYPTRK': 'float64',
+    'ALCOHOL': 'float64',
+    'DRUG': 'float64',
+    'TEMP': 'float64',
+    'TRNSPD': 'float64',
+    'TYPSPD': 'category',  # Speed Recorded (R) or Estimated (E)
+    'TONS': 'float64',
+    'ACCDMG': 'float64',
+    'EQPDMG': 'float64',
+    'TRKDMG': 'float64',
+    'CARSDMG': 'float64',
+    'TOTINJ': 'float64',
+    'TOTKLD': 'float64',
+    'PASSINJ': 'float64',
+    'PASSKLD': 'float64',
+    'OTHERINJ': 'float64',
+    'OTHERKLD': 'float64',
+}
+
 def drop_redudant_columns(df):
     """Drops columns that convey info already present in other existing columns."""
 
@@ -199,6 +238,21 @@ def sanity_checks(df):
     #damage costs
 
 
+def write_snapshot(df, path, schema):
+    """
+    Writes the dataset as a columnar Parquet snapshot with explicit column types.
+    The app loads it instead of the CSV, and can read only the columns it needs.
+    The narratives are left out, as the app reads them from the narrative store.
+    """
+    df = df.drop(columns=['NARR'], errors='ignore')
+    for column in df.columns:
+        if column in schema:
+            df[column] = df[column].astype(schema[column])
+        elif df[column].dtype == object:
+            df[column] = df[column].astype('string')
+    df.to_parquet(path, index=False)
+
+
 
 
 pd.set_option('display.max_columns', None)
@@ -224,6 +278,10 @@ df_railroad = sanity_checks(df_railroad)
 df_railroad = replace_alcohol_drug_nan(df_railroad)
 dest_path = os.path.join(current_dir, 'CleanedDataset.csv')
 df_railroad.to_csv(dest_path, sep=',', index=False)
+write_narratives(df_railroad['NARR'], os.path.join(current_dir, 'Narratives.bin'),
+                 os.path.join(current_dir, 'Narratives.offsets.npy'))
+snapshot_path = os.path.join(current_dir, 'CleanedDataset.parquet')
+write_snapshot(df_railroad, snapshot_path, SNAPSHOT_SCHEMA)
 
 
 
@@ -1,9 +1,22 @@
+import logging
+import time
+from contextlib import contextmanager
+import numpy as np
 import streamlit as st
 from filters import setup_filters
-from map_visualization import update_figure_data, map, initialize_data, initialize_figure, check_single_event,  simple_graph, parallel_coord_plot
+from map_visualization import update_figure_data, map, initialize_data, initialize_figure, check_single_event,  simple_graph, parallel_coord_plot, setup_map_controls, update_linked_filters
 from styles import CSS_STYLE
+from config import REPORT_TIMINGS
 from constants import VARIABLES, PLOT_FUNCTIONS
 
+# The app modules report through their module loggers, e.g. the dataset load summary at info level
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+if REPORT_TIMINGS:
+    # The section timings and the result cache statistics are logged at debug level
+    for name in [__name__, 'result_cache']:
+        logging.getLogger(name).setLevel(logging.DEBUG)
+
 st.set_page_config(layout="wide", page_icon="🚆", page_title="RailAlert!")
 st.markdown(CSS_STYLE, unsafe_allow_html=True)
 
@@ -13,26 +26,53 @@ col1, col2, col3 = st.sidebar.columns([1, 2, 1])
 with col2:
     st.image("jbi100_app_streamlit/assets/RailAlertLogoNoBckg.png", use_container_width=True)
 
-def main():
-    initialize_data()
-    initialize_figure()
-    map_data = st.session_state.map_data
-    selected_filter = setup_filters(map_data)
-
-    if 'callback_data' not in st.session_state:
-        st.session_state.callback_data = {}
-    
-    if isinstance(selected_filter, str):
-        st.error(selected_filter)
-    else:
+@contextmanager
+def timed_section(name):
+    """
+    Logs, at debug level (shown with REPORT_TIMINGS=1), how long a section of the page takes to run, whether it
+    runs with the whole page or on its own. The time is also logged when the section stops early, e.g. when
+    Streamlit interrupts the run.
+    :param name: (str) The name of the section.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        logger.debug("%s section ran in %.1f ms", name, (time.perf_counter() - start) * 1000)
+
+
+@st.fragment
+def map_section(selected_filter):
+    """
+    Draws the map. Selecting incidents on it only reruns this section, unless the selection changed:
+    the other views are linked to it, so the whole page is then rerun.
+    :param selected_filter: The filters that the user selected, as of the last run of the whole page.
+    """
+    with timed_section("Map"):
+        map_data = st.session_state.map_data
+        previous_selection = st.session_state.get('map_selection', np.empty(0, dtype=np.int64))
+
         # Update the figure data for the map
         update_figure_data(st.session_state.fig, map_data, selected_filter)
 
         # Display the map visualization
         map(st.session_state.fig, map_data, selected_filter)
 
-    # If not viewing a single event, show additional visualizations
-    if not check_single_event():
+    if not np.array_equal(previous_selection, st.session_state.get('map_selection', previous_selection)):
+        st.rerun()
+
+
+@st.fragment
+def explore_section(selected_filter):
+    """
+    Draws the Explore chart and its variable selection, which only rerun this section.
+    Brushing the chart reruns the whole page, as the map and the Combine plot are linked to it.
+    :param selected_filter: The filters that the user selected, as of the last run of the whole page.
+    """
+    if st.session_state.pop('explore_brush_changed', False):
+        st.rerun()
+
+    with timed_section("Explore"):
         _, container1, _ = st.columns([0.02, 1, 0.02], gap="large")
 
         with container1:
@@ -67,6 +107,18 @@ def main():
                 else:
                     st.write("No predefined plot available for this selection.")
 
+    # Changing the chart clears its brush, which the linked views must follow
+    if st.session_state.pop('explore_brush_changed', False):
+        st.rerun()
+
+
+@st.fragment
+def combine_section(selected_filter):
+    """
+    Draws the parallel coordinates plot and its controls, which only rerun this section.
+    :param selected_filter: The filters that the user selected, as of the last run of the whole page.
+    """
+    with timed_section("Combine"):
         padding_left3, container3, padding_right3 = st.columns([0.02, 1, 0.02], gap="large")
 
         with container3:
@@ -128,13 +180,42 @@ def main():
         padding_left5, container5, padding_right5 = st.columns([3, 1, 2], gap="large")
         with container5:
             binning_toggle = st.checkbox("Enable Binning", value=True)
+            aggregate_toggle = st.checkbox("Aggregate Lines", value=False,
+                                           help="Draw one line per distinct combination of values, "
+                                                "colored by its number of incidents.")
 
         with container4:
             st.write("")
             if len(vars_set) >= 2:
-                parallel_coord_plot(selected_filter, par_plot_vars, binning_toggle)
+                parallel_coord_plot(selected_filter, par_plot_vars, binning_toggle, aggregate_toggle)
             else:
                 st.write("Please select at least two distinct variables to display the parallel coordinate plot.")
 
+
+def main():
+    """
+    Runs the whole page: the sidebar filters, then the map, Explore and Combine sections.
+    Every section is a fragment that depends on the filters through its argument, so a change of the filters
+    (or of a linked selection) reruns the whole page, while the widgets of a section only rerun that section.
+    """
+    with timed_section("Filters"):
+        initialize_data()
+        initialize_figure()
+        map_data = st.session_state.map_data
+        selected_filter = setup_filters(map_data, st.session_state.data_version, st.session_state.data_catalog)
+        setup_map_controls()
+
+    if isinstance(selected_filter, str):
+        st.error(selected_filter)
+    else:
+        # Brush the linked views with the filters, then draw the map
+        update_linked_filters(selected_filter)
+        map_section(selected_filter)
+
+    # If not viewing a single event, show additional visualizations
+    if not check_single_event():
+        explore_section(selected_filter)
+        combine_section(selected_filter)
+
 if __name__ == "__main__":
     main()
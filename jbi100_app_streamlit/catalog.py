@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# Quantiles recorded for every numeric and datetime column
+QUANTILES = [0, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 1]
+
+# Number of equal-width bins of the histogram of every numeric and datetime column
+HISTOGRAM_BINS = 20
+
+# Columns with at most this many distinct values also get the count of every value
+MAX_VALUE_COUNTS = 64
+
+
+def column_statistics(series):
+    """
+    Computes the statistics of a single column.
+    Datetime statistics are expressed as timestamps, except the histogram edges which stay in
+    nanoseconds since the epoch.
+    :param series: (pd.Series) The column.
+    :return: (dict) The "nulls" and "cardinality" of the column, its "value_counts" if it has few distinct values,
+             and for numeric and datetime columns its "min", "max", "quantiles" and "histogram" ("counts" and "edges").
+    """
+    valid = series.dropna()
+    stats = {
+        "nulls": int(len(series) - len(valid)),
+        "cardinality": int(valid.nunique()),
+        "value_counts": None,
+    }
+    if stats["cardinality"] <= MAX_VALUE_COUNTS:
+        stats["value_counts"] = {
+            value.item() if hasattr(value, 'item') else value: int(count)
+            for value, count in valid.value_counts(sort=False).sort_index().items()
+        }
+
+    is_datetime = pd.api.types.is_datetime64_any_dtype(series)
+    if not (is_datetime or pd.api.types.is_numeric_dtype(series)) or pd.api.types.is_bool_dtype(series):
+        return stats
+
+    values = valid.to_numpy(dtype='datetime64[ns]').view('int64') if is_datetime else valid.to_numpy(dtype='float64')
+    if len(values) == 0:
+        stats.update(min=None, max=None, quantiles={}, histogram={"counts": np.zeros(0, dtype=np.int64), "edges": np.zeros(0)})
+        return stats
+
+    quantiles = np.quantile(values, QUANTILES)
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    convert = (lambda value: pd.Timestamp(int(value))) if is_datetime else float
+    stats.update(
+        min=convert(values.min()),
+        max=convert(values.max()),
+        quantiles={q: convert(value) for q, value in zip(QUANTILES, quantiles)},
+        histogram={"counts": counts, "edges": edges},
+    )
+    return stats
+
+
+def build_catalog(data):
+    """
+    Computes the statistics of every column of the dataset, so views can configure their widgets
+    and axes without scanning the data.
+    :param data: (pd.DataFrame) The dataset.
+    :return: (dict) The statistics of every column, see column_statistics, and the number of "rows".
+    """
+    return {
+        "rows": len(data),
+        "columns": {column: column_statistics(data[column]) for column in data.columns},
+    }
+
+
+def column_bounds(catalog, column, padding=0):
+    """
+    Returns the [min, max] range of a column, e.g. for a plot axis.
+    :param catalog: (dict) The statistics catalog.
+    :param column: (str) The column.
+    :param padding: (float) The margin added on both sides, as a fraction of the range.
+    :return: (list) The range, or None if the column has no numeric values.
+    """
+    stats = catalog["columns"].get(column, {})
+    if stats.get("min") is None:
+        return None
+    low, high = stats["min"], stats["max"]
+    margin = (high - low) * padding
+    return [low - margin, high + margin]
@@ -10,6 +10,9 @@ DEFAULT_STYLE = "mapbox://styles/mapbox/streets-v12"
 
 # File paths
 DATA_PATH = 'Railroad_Incidents_Data/CleanedDataset.csv'
+SNAPSHOT_PATH = 'Railroad_Incidents_Data/CleanedDataset.parquet'
+NARRATIVES_PATH = 'Railroad_Incidents_Data/Narratives.bin'
+NARRATIVE_OFFSETS_PATH = 'Railroad_Incidents_Data/Narratives.offsets.npy'
 
 # Map configurations
 MAP_CONFIGS = {
@@ -22,3 +25,33 @@ MAP_CONFIGS = {
         "lon": [-150.0, -40]    # Min and max longitudes
     }
 }
+
+# Map display modes: "Auto" draws the incidents in view as individual markers up to MAP_POINT_BUDGET of them,
+# as a grid of aggregated cells up to MAP_DENSITY_THRESHOLD, and as a density heatmap above
+# ("Points" downsamples to MAP_POINT_BUDGET instead)
+MAP_MODES = ["Auto", "Points", "Grid", "Density"]
+MAP_POINT_BUDGET = 50000
+MAP_DENSITY_THRESHOLD = 200000
+GRID_CELL_PIXELS = 24  # On-screen size of a grid cell
+DENSITY_CELL_PIXELS = 8  # On-screen size of a cell of the density grid
+DENSITY_BANDWIDTH = 1.5  # Standard deviation of the density kernel, in density grid cells
+SPATIAL_INDEX_CELL_SIZE = 0.5  # Size in degrees of the cells of the spatial index used to find the incidents in view
+# Assumed size in pixels of the map, used to find the area shown at a zoom level. Only the incidents in that area,
+# extended by MAP_VIEW_MARGIN of its size on every side, are sent, and the map cannot be panned past them
+MAP_VIEWPORT_PIXELS = (1200, 700)
+MAP_VIEW_MARGIN = 0.5
+
+# Print the size and encoding time of the figures sent to the browser, as JSON lists and as typed arrays
+REPORT_FIGURE_PAYLOAD = os.getenv('REPORT_FIGURE_PAYLOAD') == '1'
+
+# Log how long every section of the page takes to run, and the result cache statistics on every miss
+REPORT_TIMINGS = os.getenv('REPORT_TIMINGS') == '1'
+
+# Memory budget of the result cache shared by all sessions (filter results and the figures derived from them)
+RESULT_CACHE_BUDGET = 256 * 1024 ** 2
+
+# Explore scatter plots are drawn with WebGL above SCATTER_WEBGL_THRESHOLD rows, and as a density heatmap
+# binned on the server (SCATTER_RASTER_BINS bins per axis) above SCATTER_RASTER_THRESHOLD rows
+SCATTER_WEBGL_THRESHOLD = 2000
+SCATTER_RASTER_THRESHOLD = 100000
+SCATTER_RASTER_BINS = 200
@@ -1,12 +1,18 @@
 import plotly.express as px
+import plotly.graph_objects as go
 import numpy as np
+import pandas as pd
+from catalog import column_bounds
+from time_buckets import bucket_keys
+from config import SCATTER_WEBGL_THRESHOLD, SCATTER_RASTER_THRESHOLD, SCATTER_RASTER_BINS
 
-def plot_line_chart(data, x_var, y_var):
+def plot_line_chart(data, x_var, y_var, catalog=None):
     """
     Creates a line chart comparing an x-axis variable and a y-axis variable.
     :param data: (pd.DataFrame) The dataset containing the variables to be plotted.
     :param x_var: (str) The name of the variable to be plotted on the x-axis.
     :param y_var: (str) The name of the variable to be plotted on the y-axis.
+    :param catalog: (dict) The statistics catalog of the dataset; if given, the x-axis spans the whole dataset.
     :return: A line chart visualizing the relationship between the x-axis and y-axis variables.        
     """
     x_var_data = VARNAMES_TO_DATASET[x_var]
@@ -35,23 +41,37 @@ def plot_line_chart(data, x_var, y_var):
             labels={x_var_data: x_var, y_var_data: y_var}
         )
 
-    # Pass only metadata as customdata
-    fig.update_traces(customdata=[[x_var, y_var]] * len(data))
+    if catalog is not None:
+        fig.update_xaxes(range=column_bounds(catalog, x_var_data, padding=0.02))
     return fig
 
 
-def plot_bar_chart(data, categorical_var, numerical_var):
+def plot_bar_chart(data, categorical_var, numerical_var, catalog=None, grouped=None):
     """
     Creates a bar chart comparing a categorical variable and a numerical variable.
     :param data: (pd.DataFrame) The dataset containing the variables to be plotted.
     :param categorical_var: (str) The name of the categorical variable to group data by.
     :param numerical_var: (str) The name of the numerical variable to aggregate data.
+    :param catalog: (dict) The statistics catalog of the dataset (unused, the axes depend on the grouped data).
+    :param grouped: (pd.DataFrame) The data already grouped by the categorical variable, e.g. rolled up from
+                    the cube (see cube.rollup); if given, data is not used.
     :return: A bar chart showing the relationship between the categorical and numerical variables.
     """
     cat_var_data = VARNAMES_TO_DATASET[categorical_var]
     num_var_data = VARNAMES_TO_DATASET[numerical_var]
+
+    # Group the data by the categorical variable
+    if grouped is not None:
+        grouped_data = grouped
+    elif num_var_data == "🔢 Number of Accidents":
+        grouped_data = data.groupby(
+            cat_var_data).size().reset_index(name='Counts')
+    else:
+        grouped_data = data.groupby(cat_var_data)[
+            num_var_data].mean().reset_index()
+
     # Get axis labels
-    unique_cat_var_labels = np.array(data[cat_var_data].unique(), dtype=int)
+    unique_cat_var_labels = np.array(grouped_data[cat_var_data].unique(), dtype=int)
     cat_var_descriptions = DESCRIPTION_MAPPINGS[categorical_var]
 
     # Match unique labels with their descriptions
@@ -60,14 +80,6 @@ def plot_bar_chart(data, categorical_var, numerical_var):
         if int(code) in unique_cat_var_labels
     ]
 
-    # Group the data by the categorical variable
-    if num_var_data == "🔢 Number of Accidents":
-        grouped_data = data.groupby(
-            cat_var_data).size().reset_index(name='Counts')
-    else:
-        grouped_data = data.groupby(cat_var_data)[
-            num_var_data].mean().reset_index()
-
     # Create the bar chart
     fig = px.bar(
         grouped_data,
@@ -78,52 +90,141 @@ def plot_bar_chart(data, categorical_var, numerical_var):
                 "🔢 Number of Accidents" else num_var_data}
     )
 
-    # Add custom data (latitude and longitude) to each bar
-    fig.update_traces(
-        customdata=[[categorical_var, numerical_var]] * len(data))
+    # Every bar carries the code of its group, the plotted variables are kept in the session state
+    fig.update_traces(customdata=grouped_data[cat_var_data].to_numpy())
 
     # Return the figure
     return fig
 
 
-def plot_scatter(data, x_var, y_var):
+def plot_scatter(data, x_var, y_var, catalog=None):
     """
     Creates a scatter plot showing the relationship between two variables.
     :param data: (pd.DataFrame) The dataset containing the variables to be plotted.
     :param x_var: (str) The name of the variable to be plotted on the x-axis.
     :param y_var: (str) The name of the variable to be plotted on the y-axis.
+    :param catalog: (dict) The statistics catalog of the dataset; if given, both axes span the whole dataset.
     :return: A scatter plot visualizing the relationship between the x-axis and y-axis variables.
+             Above SCATTER_RASTER_THRESHOLD rows, a density heatmap instead, see plot_scatter_density.
     """
     x_var_data = VARNAMES_TO_DATASET[x_var]
     y_var_data = VARNAMES_TO_DATASET[y_var]
 
+    if len(data) > SCATTER_RASTER_THRESHOLD:
+        return plot_scatter_density(data, x_var, y_var, catalog)
+
     fig = px.scatter(
         data,
         x=x_var_data,
         y=y_var_data,
         title=f"{x_var} vs {y_var}",
         labels={x_var_data: x_var, y_var_data: y_var},
-        opacity=0.7
+        opacity=0.7,
+        render_mode='webgl' if len(data) > SCATTER_WEBGL_THRESHOLD else 'svg'
     )
 
-    # Pass only metadata as customdata
-    fig.update_traces(customdata=[[x_var, y_var]] * len(data))
+    if catalog is not None:
+        fig.update_xaxes(range=column_bounds(catalog, x_var_data, padding=0.02))
+        fig.update_yaxes(range=column_bounds(catalog, y_var_data, padding=0.02))
+    return fig
+
+
+def axis_values(series):
+    """
+    Returns the values of a column as floats that can be binned, datetimes as nanoseconds since the epoch.
+    :param series: (pd.Series) The column.
+    :return: (np.ndarray) The float values, NaN where missing.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype='datetime64[ns]')
+        return np.where(np.isnat(values), np.nan, values.view('int64').astype('float64'))
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+
+def plot_scatter_density(data, x_var, y_var, catalog=None):
+    """
+    Creates a density heatmap of two variables, binned on the server, for datasets too large to draw point by point.
+    Hovering a bin shows the number of incidents in it.
+    :param data: (pd.DataFrame) The dataset containing the variables to be plotted.
+    :param x_var: (str) The name of the variable to be plotted on the x-axis.
+    :param y_var: (str) The name of the variable to be plotted on the y-axis.
+    :param catalog: (dict) The statistics catalog of the dataset; if given, the bins span the whole dataset.
+    :return: A heatmap of the number of incidents per bin.
+    """
+    x_var_data = VARNAMES_TO_DATASET[x_var]
+    y_var_data = VARNAMES_TO_DATASET[y_var]
+    x_values = axis_values(data[x_var_data])
+    y_values = axis_values(data[y_var_data])
+    valid = ~(np.isnan(x_values) | np.isnan(y_values))
+    x_values, y_values = x_values[valid], y_values[valid]
+
+    # Bins cover the whole dataset when the catalog is given, so they do not move when filters change
+    bin_range = []
+    for column, values in [(x_var_data, x_values), (y_var_data, y_values)]:
+        bounds = column_bounds(catalog, column) if catalog is not None else None
+        if bounds is None:
+            bounds = [values.min(), values.max()] if len(values) > 0 else [0, 1]
+        low, high = (bound.value if isinstance(bound, pd.Timestamp) else float(bound) for bound in bounds)
+        bin_range.append([low, high if high > low else low + 1])
+
+    counts, x_edges, y_edges = np.histogram2d(x_values, y_values, bins=SCATTER_RASTER_BINS, range=bin_range)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    if pd.api.types.is_datetime64_any_dtype(data[x_var_data]):
+        x_centers = pd.to_datetime(x_centers.astype('int64'))
+    if pd.api.types.is_datetime64_any_dtype(data[y_var_data]):
+        y_centers = pd.to_datetime(y_centers.astype('int64'))
+
+    fig = go.Figure(go.Heatmap(
+        x=x_centers,
+        y=y_centers,
+        z=np.where(counts.T > 0, counts.T, np.nan),  # Empty bins are left transparent
+        colorscale='Blues',
+        colorbar=dict(title=dict(text='Incidents')),
+        hovertemplate=f"{x_var}: %{{x}}<br>{y_var}: %{{y}}<br>%{{z}} incidents<extra></extra>",
+    ))
+    fig.update_layout(
+        title=f"{x_var} vs {y_var}",
+        xaxis_title=x_var,
+        yaxis_title=y_var,
+    )
     return fig
 
 
-def plot_year_month_heatmap(data, x_var, y_var):
-    df = data.copy()
-    df['YEAR'] = df['DATETIME'].dt.year
-    df['MONTH'] = df['DATETIME'].dt.month
-    grouped = df.groupby(['YEAR', 'MONTH']).size().reset_index(name='counts')
-    pivoted = grouped.pivot(index='YEAR', columns='MONTH',
-                            values='counts').fillna(0)
+def plot_year_month_heatmap(data, x_var, y_var, catalog=None, grouped=None):
+    """
+    Creates a heatmap of the number of incidents per year and month.
+    :param data: (pd.DataFrame) The dataset containing the incidents.
+    :param x_var: (str) The name of the variable on the x-axis (the date).
+    :param y_var: (str) The name of the variable on the y-axis (the number of accidents).
+    :param catalog: (dict) The statistics catalog of the dataset (unused).
+    :param grouped: (pd.DataFrame) The incident counts ('Counts') per year-month key ('YM', year * 12 + month - 1),
+                    e.g. rolled up from the cube or counted from the time buckets; if given, data is not used.
+    :return: A heatmap with one row per year and one column per month.
+    """
+    if grouped is not None:
+        keys = grouped['YM'].to_numpy()
+        counts = grouped['Counts'].to_numpy()
+    else:
+        keys = bucket_keys(data['DATETIME'], 'month')
+        keys = keys[keys >= 0]
+        counts = np.ones(len(keys), dtype=np.int64)
+
+    # A single bincount lays the counts out as a years x 12 months matrix
+    if len(keys) > 0:
+        first_year, last_year = keys.min() // 12, keys.max() // 12
+        matrix = np.bincount(keys - first_year * 12, weights=counts, minlength=(last_year - first_year + 1) * 12)
+        matrix = matrix.astype(np.int64).reshape(-1, 12)
+        years = np.arange(first_year, last_year + 1)
+    else:
+        matrix = np.zeros((0, 12), dtype=np.int64)
+        years = np.zeros(0, dtype=np.int64)
 
     fig = px.imshow(
-        pivoted,
+        matrix,
         labels={'x': 'Month', 'y': 'Year', 'color': 'Incidents'},
-        x=pivoted.columns,
-        y=pivoted.index,
+        x=np.arange(1, 13),
+        y=years,
         color_continuous_scale='Blues',
         aspect='auto'
     )
@@ -293,3 +394,9 @@ DESCRIPTION_MAPPINGS = {
     "🚊 Track Type": TRACK_DESCRIPTIONS,
     "💥 Incident Type": TYPE_DESCRIPTIONS,
 }
+
+# Maps every description back to its code, per dataset column, to resolve chart selections
+DESCRIPTION_CODES = {
+    VARNAMES_TO_DATASET[var]: {description: int(code) for code, description in descriptions.items()}
+    for var, descriptions in DESCRIPTION_MAPPINGS.items()
+}
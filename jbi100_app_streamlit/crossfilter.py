@@ -0,0 +1,225 @@
+import numpy as np
+from filter_engine import group_positions, group_slices
+
+# Every dimension owns one bit of the per-row filter bits, so at most 8 dimensions fit in a uint8
+MAX_DIMENSIONS = 8
+
+
+def new_crossfilter(size):
+    """
+    Creates an empty linked-selection engine over the rows of a dataset, in the style of crossfilter.
+    Every view registers a dimension and filters (brushes) it. Every row keeps one bit per dimension
+    telling whether that dimension filters it out, and every grouped dimension keeps the counts (and
+    measure sums) of its groups over the rows that pass all the other dimensions. Changing a brush
+    only visits the rows whose bit flips.
+    :param size: (int) The number of rows of the dataset.
+    :return: (dict) The engine.
+    """
+    return {
+        "size": size,
+        "bits": np.zeros(size, dtype=np.uint8),
+        "dimensions": {},
+    }
+
+
+def add_dimension(crossfilter, name, groups=None, measures=None):
+    """
+    Registers a dimension, initially not filtering any row.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    :param groups: (dict) The row groups of the column the dimension brushes, see filter_engine.build_row_groups,
+                   or None for a dimension filtered by an arbitrary row mask (e.g. a map selection).
+    :param measures: (dict) Optional measure name -> value of every row, summed per group.
+    """
+    used = {dimension["bit"] for dimension in crossfilter["dimensions"].values()}
+    free = [bit for bit in range(MAX_DIMENSIONS) if bit not in used]
+    if not free:
+        raise ValueError(f"A crossfilter holds at most {MAX_DIMENSIONS} dimensions.")
+
+    dimension = {"bit": free[0], "groups": groups, "selected": None, "measures": {}}
+    if groups is not None:
+        codes = groups["codes"]
+        counted = (crossfilter["bits"] == 0) & (codes >= 0)
+        dimension["counts"] = np.bincount(codes[counted], minlength=len(groups["values"])).astype(np.int64)
+        dimension["sums"] = {}
+        dimension["valid"] = {}
+        for measure, values in (measures or {}).items():
+            values = np.asarray(values, dtype=np.float64)
+            valid = ~np.isnan(values)
+            dimension["measures"][measure] = (np.nan_to_num(values), valid)
+            dimension["sums"][measure] = np.bincount(codes[counted], weights=np.nan_to_num(values)[counted],
+                                                     minlength=len(groups["values"]))
+            dimension["valid"][measure] = np.bincount(codes[counted & valid], minlength=len(groups["values"])).astype(np.int64)
+    crossfilter["dimensions"][name] = dimension
+
+
+def remove_dimension(crossfilter, name):
+    """
+    Removes a dimension, first clearing its filter so the other dimensions count its rows again.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    """
+    if name in crossfilter["dimensions"]:
+        filter_all(crossfilter, name)
+        del crossfilter["dimensions"][name]
+
+
+def flip_rows(crossfilter, name, rows):
+    """
+    Flips the filter bit of a dimension on the given rows, updating the group counts and sums of
+    every other dimension for those rows only.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    :param rows: (np.ndarray) The rows whose bit flips.
+    """
+    if len(rows) == 0:
+        return
+    bit = np.uint8(1 << crossfilter["dimensions"][name]["bit"])
+    old = crossfilter["bits"][rows]
+    new = old ^ bit
+
+    for other_name, other in crossfilter["dimensions"].items():
+        if other_name == name or other["groups"] is None:
+            continue
+        # A row is counted by a dimension when no other dimension filters it out
+        other_mask = ~np.uint8(1 << other["bit"])
+        delta = ((new & other_mask) == 0).astype(np.int64) - ((old & other_mask) == 0).astype(np.int64)
+        codes = other["groups"]["codes"][rows]
+        changed = (delta != 0) & (codes >= 0)
+        codes, delta, changed_rows = codes[changed], delta[changed], rows[changed]
+        size = len(other["counts"])
+
+        other["counts"] += np.bincount(codes, weights=delta, minlength=size).astype(np.int64)
+        for measure, (values, valid) in other["measures"].items():
+            other["sums"][measure] += np.bincount(codes, weights=delta * values[changed_rows], minlength=size)
+            other["valid"][measure] += np.bincount(codes, weights=delta * valid[changed_rows], minlength=size).astype(np.int64)
+
+    crossfilter["bits"][rows] = new
+
+
+def filter_mask(crossfilter, name, mask):
+    """
+    Filters a dimension with a row mask.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    :param mask: (np.ndarray) The boolean mask of the rows that pass, or None to let every row pass.
+    """
+    bit = np.uint8(1 << crossfilter["dimensions"][name]["bit"])
+    filtered = (crossfilter["bits"] & bit) != 0
+    if mask is None:
+        rows = np.flatnonzero(filtered)
+    else:
+        rows = np.flatnonzero(filtered == np.asarray(mask, dtype=bool))
+    crossfilter["dimensions"][name]["selected"] = None if mask is None else True
+    flip_rows(crossfilter, name, rows)
+
+
+def filter_groups(crossfilter, name, selected):
+    """
+    Filters a grouped dimension by group: only the rows of the selected groups pass.
+    Only the rows of the groups whose selection changed are visited.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    :param selected: (np.ndarray) The boolean selection of every group, or None to let every row pass
+                     (including the rows without a value).
+    """
+    dimension = crossfilter["dimensions"][name]
+    groups = dimension["groups"]
+    everything = np.ones(len(groups["values"]), dtype=bool)
+    old = everything if dimension["selected"] is None else dimension["selected"]
+    new = everything if selected is None else np.asarray(selected, dtype=bool)
+
+    rows = [group_slices(groups, np.flatnonzero(old != new))]
+    # Rows without a value only pass while the dimension is not filtered
+    if (dimension["selected"] is None) != (selected is None):
+        rows.append(np.flatnonzero(groups["codes"] < 0))
+    dimension["selected"] = None if selected is None else new
+    flip_rows(crossfilter, name, np.concatenate(rows))
+
+
+def filter_values(crossfilter, name, values):
+    """
+    Filters a grouped dimension to the rows holding any of the given values.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    :param values: (list) The values, matched up to float32 precision.
+    :return: (int) The number of groups matched by the values.
+    """
+    groups = crossfilter["dimensions"][name]["groups"]
+    positions = group_positions(groups, values)
+    selected = np.zeros(len(groups["values"]), dtype=bool)
+    selected[positions] = True
+    filter_groups(crossfilter, name, selected)
+    return len(positions)
+
+
+def filter_all(crossfilter, name):
+    """
+    Clears the filter of a dimension.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    """
+    if crossfilter["dimensions"][name]["groups"] is None:
+        filter_mask(crossfilter, name, None)
+    else:
+        filter_groups(crossfilter, name, None)
+
+
+def is_filtered(crossfilter, name):
+    """
+    Tells whether a dimension currently filters rows.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the dimension.
+    :return: (bool) True if the dimension is registered and filtered.
+    """
+    dimension = crossfilter["dimensions"].get(name)
+    return dimension is not None and dimension["selected"] is not None
+
+
+def passing_mask(crossfilter, exclude=()):
+    """
+    Returns the rows passing the filters of every dimension, ignoring the excluded ones.
+    :param crossfilter: (dict) The engine.
+    :param exclude: (list) The names of the dimensions whose filters are ignored, e.g. the view being drawn.
+    :return: (np.ndarray) The boolean mask of the passing rows.
+    """
+    ignored = 0
+    for name in exclude:
+        if name in crossfilter["dimensions"]:
+            ignored |= 1 << crossfilter["dimensions"][name]["bit"]
+    return (crossfilter["bits"] & np.uint8(~ignored & 0xFF)) == 0
+
+
+def passing_rows(crossfilter, exclude=()):
+    """
+    Returns the row numbers passing the filters of every dimension, see passing_mask.
+    :param crossfilter: (dict) The engine.
+    :param exclude: (list) The names of the dimensions whose filters are ignored.
+    :return: (np.ndarray) The sorted row numbers.
+    """
+    return np.flatnonzero(passing_mask(crossfilter, exclude))
+
+
+def group_counts(crossfilter, name):
+    """
+    Returns the groups of a dimension with their number of rows passing all the other dimensions.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the grouped dimension.
+    :return: (tuple) The group values and their counts.
+    """
+    dimension = crossfilter["dimensions"][name]
+    return dimension["groups"]["values"], dimension["counts"]
+
+
+def group_means(crossfilter, name, measure):
+    """
+    Returns the groups of a dimension with the mean of a measure over their rows passing all the other dimensions.
+    :param crossfilter: (dict) The engine.
+    :param name: (str) The name of the grouped dimension.
+    :param measure: (str) The measure, registered with the dimension.
+    :return: (tuple) The group values and their means (NaN for groups without a value of the measure).
+    """
+    dimension = crossfilter["dimensions"][name]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = dimension["sums"][measure] / dimension["valid"][measure]
+    return dimension["groups"]["values"], means
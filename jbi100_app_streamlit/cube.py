@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+from filter_engine import bound_value
+from time_buckets import bucket_keys
+
+# Categorical dimensions of the cube, missing codes are stored as -1
+CUBE_DIMENSIONS = ['TYPE', 'WEATHER', 'VISIBLTY', 'TYPTRK', 'STATE']
+
+# Measures summed in every cell, together with their count of non-missing values so means can be rolled up
+CUBE_MEASURES = ['TRNSPD', 'ACCDMG', 'TOTINJ', 'TOTKLD', 'TEMP']
+
+# Range-filtered columns whose missing values are tracked per cell, one bit each in the "missing" dimension.
+# A range filter covering every value of such a column still drops its rows without a value.
+MISSING_COLUMNS = ['TEMP', 'TRNSPD', 'ACCDMG', 'TOTKLD', 'TOTINJ']
+
+
+def build_cube(data):
+    """
+    Aggregates the dataset over the categorical dimensions, the year-month and the missing-value flags:
+    one cell per combination that occurs, holding its row count and, per measure, the sum and
+    count of its values.
+    :param data: (pd.DataFrame) The dataset.
+    :return: (dict) The cube: the "dims" arrays of every cell (including "YM" and "missing"),
+             its "counts", and the "sums" and "valid" counts of every measure.
+    """
+    keys = {column: data[column].to_numpy(dtype='float64', na_value=np.nan) for column in CUBE_DIMENSIONS}
+    keys = {column: np.nan_to_num(values, nan=-1).astype(np.int64) for column, values in keys.items()}
+    keys['YM'] = bucket_keys(data['DATETIME'], 'month')
+    missing = np.zeros(len(data), dtype=np.int64)
+    for bit, column in enumerate(MISSING_COLUMNS):
+        missing |= data[column].isna().to_numpy().astype(np.int64) << bit
+    keys['missing'] = missing
+
+    frame = pd.DataFrame(keys)
+    for measure in CUBE_MEASURES:
+        values = data[measure].to_numpy(dtype='float64', na_value=np.nan)
+        frame[f"{measure}_sum"] = np.nan_to_num(values)
+        frame[f"{measure}_valid"] = ~np.isnan(values)
+
+    grouped = frame.groupby(list(keys), sort=False)
+    cells = grouped.sum()
+    cells['count'] = grouped.size()
+    cells = cells.reset_index()
+
+    return {
+        "dims": {column: cells[column].to_numpy() for column in keys},
+        "counts": cells['count'].to_numpy(),
+        "sums": {measure: cells[f"{measure}_sum"].to_numpy() for measure in CUBE_MEASURES},
+        "valid": {measure: cells[f"{measure}_valid"].to_numpy() for measure in CUBE_MEASURES},
+    }
+
+
+def range_covers_all(index, column, low, high):
+    """
+    Tells whether a range keeps every row that has a value in the column.
+    :param index: (dict) The filter index, see filter_engine.build_filter_index.
+    :param column: (str) The range column.
+    :param low: The lower bound (inclusive).
+    :param high: The upper bound (inclusive).
+    :return: (bool) True if no row with a value is dropped by the range.
+    """
+    sorted_values = index["ranges"][column]["sorted_values"]
+    return len(sorted_values) == 0 or (sorted_values[0] >= low and sorted_values[-1] <= high)
+
+
+def month_span(low, high):
+    """
+    Returns the year-month keys of the first and last months lying entirely within a DATETIME range.
+    :param low: (int) The lower bound in nanoseconds since the epoch.
+    :param high: (int) The upper bound in nanoseconds since the epoch.
+    :return: (tuple) The first and last year-month keys, the first greater than the last if no month lies
+             entirely within the range.
+    """
+    first, last = pd.Timestamp(low), pd.Timestamp(high)
+    first_key = first.year * 12 + first.month - 1
+    if first > pd.Timestamp(year=first.year, month=first.month, day=1):
+        first_key += 1
+    last_key = last.year * 12 + last.month - 1
+    next_month = pd.Timestamp(year=last.year, month=last.month, day=1) + pd.DateOffset(months=1)
+    if last + pd.Timedelta(1, unit='ns') < next_month:
+        last_key -= 1
+    return first_key, last_key
+
+
+def cube_cells(cube, index, spec):
+    """
+    Returns the cube cells holding the rows selected by a filter spec.
+    A DATETIME range usually starts or ends within a month: the cells then only cover the months lying
+    entirely within the range, and the selected rows of the other months must be added, see edge_rows.
+    :param cube: (dict) The cube, see build_cube.
+    :param index: (dict) The filter index, see filter_engine.build_filter_index.
+    :param spec: (dict) The filter spec, see filter_engine.query_bitmap.
+    :return: (tuple) The boolean mask of the selected cells and the (first, last) year-month keys of the months
+             they cover, or None for the months if the spec has no DATETIME range. None if the cube cannot
+             express the spec (a range that drops rows of a column other than DATETIME, or a code filter
+             on a column that is not a dimension).
+    """
+    dims = cube["dims"]
+    cells = np.ones(len(cube["counts"]), dtype=bool)
+    months = None
+
+    for column, (low, high) in spec.get("ranges", {}).items():
+        low, high = bound_value(low), bound_value(high)
+        if column == "DATETIME":
+            months = month_span(low, high)
+            cells &= (dims["YM"] >= months[0]) & (dims["YM"] <= months[1])
+        elif column in MISSING_COLUMNS and range_covers_all(index, column, low, high):
+            cells &= (dims["missing"] & (1 << MISSING_COLUMNS.index(column))) == 0
+        else:
+            return None
+
+    for column, codes in spec.get("codes", {}).items():
+        if column not in CUBE_DIMENSIONS:
+            return None
+        column_index = index["codes"][column]
+        # Like the filter engine, selecting every code of a complete column keeps every row
+        if column_index["complete"] and set(codes).issuperset(column_index["bitmaps"]):
+            continue
+        cells &= np.isin(dims[column], list(codes))
+
+    return cells, months
+
+
+def edge_rows(month_keys, mask, months):
+    """
+    Returns the selected rows that the cube cells do not cover: those outside the months covered by the cells.
+    :param month_keys: (np.ndarray) The year-month key of every row, see time_buckets.row_keys.
+    :param mask: (np.ndarray) The boolean mask of the rows selected by the filter spec.
+    :param months: (tuple) The months covered by the cells, see cube_cells.
+    :return: (np.ndarray) The row numbers.
+    """
+    if months is None:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(mask & ((month_keys < months[0]) | (month_keys > months[1])))
+
+
+def merge_cubes(cubes):
+    """
+    Puts the cells of several cubes together, e.g. the cube of the dataset and a cube of a few rows it does not cover.
+    :param cubes: (list) The cubes, see build_cube.
+    :return: (dict) The cube holding all their cells.
+    """
+    return {
+        "dims": {column: np.concatenate([cube["dims"][column] for cube in cubes]) for column in cubes[0]["dims"]},
+        "counts": np.concatenate([cube["counts"] for cube in cubes]),
+        "sums": {measure: np.concatenate([cube["sums"][measure] for cube in cubes]) for measure in CUBE_MEASURES},
+        "valid": {measure: np.concatenate([cube["valid"][measure] for cube in cubes]) for measure in CUBE_MEASURES},
+    }
+
+
+def rollup(cube, cells, dimensions, measure=None):
+    """
+    Rolls the selected cells of the cube up to the given dimensions.
+    :param cube: (dict) The cube, see build_cube.
+    :param cells: (np.ndarray) The boolean mask of the selected cells, see cube_cells.
+    :param dimensions: (list) The dimensions to group by ("YM" for the year-month).
+    :param measure: (str) The measure to average, or None to count rows.
+    :return: (pd.DataFrame) One row per group with at least one row (missing codes left out), sorted by
+             the dimensions, with a 'Counts' column or the mean of the measure in a column named after it.
+    """
+    frame = pd.DataFrame({dimension: cube["dims"][dimension][cells] for dimension in dimensions})
+    frame['Counts'] = cube["counts"][cells]
+    if measure is not None:
+        frame['sum'] = cube["sums"][measure][cells]
+        frame['valid'] = cube["valid"][measure][cells]
+
+    frame = frame[(frame[dimensions] >= 0).all(axis=1)]
+    grouped = frame.groupby(dimensions, sort=True).sum().reset_index()
+    grouped = grouped[grouped['Counts'] > 0]
+    if measure is None:
+        return grouped[dimensions + ['Counts']]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grouped[measure] = grouped['sum'] / grouped['valid']
+    return grouped[dimensions + [measure]]
+
+
+def filtered_rollup(cube, index, spec, data, mask, month_keys, dimensions, measure=None):
+    """
+    Rolls the rows selected by a filter spec up to the given dimensions, from the cube whenever it can express the spec.
+    The selected rows of the months only partly covered by a DATETIME range are aggregated on the fly.
+    :param cube: (dict) The cube of the dataset, see build_cube.
+    :param index: (dict) The filter index, see filter_engine.build_filter_index.
+    :param spec: (dict) The filter spec, see filter_engine.query_bitmap.
+    :param data: (pd.DataFrame) The dataset.
+    :param mask: (np.ndarray) The boolean mask of the rows selected by the filter spec.
+    :param month_keys: (np.ndarray) The year-month key of every row, see time_buckets.row_keys.
+    :param dimensions: (list) The dimensions to group by, see rollup.
+    :param measure: (str) The measure to average, or None to count rows.
+    :return: (pd.DataFrame) The rolled up data, see rollup, or None if the cube cannot express the spec.
+    """
+    selection = cube_cells(cube, index, spec)
+    if selection is None:
+        return None
+    cells, months = selection
+
+    edges = edge_rows(month_keys, mask, months)
+    if len(edges) > 0:
+        edge_cube = build_cube(data.iloc[edges])
+        cube = merge_cubes([cube, edge_cube])
+        cells = np.concatenate([cells, np.ones(len(edge_cube["counts"]), dtype=bool)])
+    return rollup(cube, cells, dimensions, measure)
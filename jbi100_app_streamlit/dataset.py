@@ -0,0 +1,170 @@
+import logging
+import os
+import time
+from importlib.util import find_spec
+import numpy as np
+import pandas as pd
+import streamlit as st
+from catalog import build_catalog
+from config import DATA_PATH, SNAPSHOT_PATH
+from narratives import ensure_narrative_store
+from time_buckets import build_time_buckets
+
+logger = logging.getLogger(__name__)
+
+# Reading the Parquet snapshot requires pyarrow, otherwise the app falls back to the CSV
+PARQUET_AVAILABLE = find_spec("pyarrow") is not None
+
+# Columns read by the filters, the map, the plots or the single event view; all other columns are never loaded.
+# The narratives (NARR) are read on demand from the narrative store instead, see narratives.py
+VIEW_COLUMNS = [
+    'DATETIME', 'YEAR', 'MONTH', 'DAY', 'TIMEHR', 'TIMEMIN', 'AMPM',
+    'Latitude', 'Longitude', 'STATE', 'COUNTY', 'MILEPOST',
+    'TYPE', 'VISIBLTY', 'WEATHER', 'TYPTRK', 'TRKCLAS', 'ALCOHOL', 'DRUG',
+    'TEMP', 'TRNSPD', 'TYPSPD', 'TRNNBR', 'TRNDIR', 'TONS',
+    'ACCDMG', 'EQPDMG', 'TRKDMG', 'CARSDMG',
+    'TOTINJ', 'TOTKLD', 'PASSINJ', 'PASSKLD', 'OTHERINJ', 'OTHERKLD',
+]
+
+# Text columns with at most this ratio of distinct values are stored as categoricals
+CATEGORY_RATIO = 0.5
+
+
+def dataset_version(path):
+    """
+    Returns a version tag for the dataset file, which changes whenever the file is rewritten.
+    :param path: (str) The path to the dataset file.
+    :return: (tuple) The path, modification time (in nanoseconds) and size of the file.
+    """
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def dataset_path():
+    """
+    Returns the path of the file the dataset should be loaded from.
+    The binary snapshot written by clean_dataset.py is preferred, unless it is missing,
+    older than the CSV or cannot be read in this environment.
+    :return: (str) The path to the dataset file.
+    """
+    if PARQUET_AVAILABLE and os.path.exists(SNAPSHOT_PATH):
+        if not os.path.exists(DATA_PATH) or os.path.getmtime(SNAPSHOT_PATH) >= os.path.getmtime(DATA_PATH):
+            return SNAPSHOT_PATH
+    return DATA_PATH
+
+
+def read_dataset(path, columns=None):
+    """
+    Reads the dataset from the snapshot or the CSV file.
+    The snapshot already stores typed columns, the CSV needs its DATETIME column to be parsed.
+    :param path: (str) The path to the dataset file.
+    :param columns: (list) The columns to read, or None to read all of them.
+    :return: (pd.DataFrame) The dataset.
+    """
+    if path.endswith('.parquet'):
+        if columns is not None:
+            from pyarrow.parquet import read_schema
+            available = set(read_schema(path).names)
+            columns = [column for column in columns if column in available]
+        return pd.read_parquet(path, columns=columns)
+
+    usecols = None if columns is None else (lambda column: column in columns)
+    data = pd.read_csv(path, usecols=usecols, low_memory=False)
+    if 'DATETIME' in data.columns:
+        data['DATETIME'] = pd.to_datetime(data['DATETIME'])
+    return data
+
+
+def narrow_column(series):
+    """
+    Converts a column to the smallest type that holds its values without losing precision.
+    Whole numbers without missing values become the smallest fitting integer type, other
+    floats become float32 when that round-trips exactly, and repetitive text becomes categorical.
+    :param series: (pd.Series) The column to narrow.
+    :return: (pd.Series) The narrowed column, or the original one if it cannot be narrowed.
+    """
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy()
+        if np.isfinite(values).all() and (values % 1 == 0).all():
+            return pd.to_numeric(series.astype('int64'), downcast='integer')
+        narrowed = series.astype('float32')
+        if np.array_equal(narrowed.to_numpy().astype('float64'), values, equal_nan=True):
+            return narrowed
+        return series
+
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        if series.nunique(dropna=True) <= CATEGORY_RATIO * len(series):
+            return series.astype('category')
+    return series
+
+
+def compact_frame(data):
+    """
+    Shrinks the in-memory representation of the dataset: columns no view reads are dropped
+    and the remaining ones are narrowed with narrow_column.
+    :param data: (pd.DataFrame) The dataset as read from disk.
+    :return: (tuple) The compacted dataset and a per-column report of the memory used before and after, in bytes.
+    """
+    before = data.memory_usage(deep=True, index=False)
+    compacted = pd.DataFrame(
+        {column: narrow_column(data[column]) for column in data.columns if column in VIEW_COLUMNS},
+        index=data.index
+    )
+    after = compacted.memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({
+        'dtype_before': data.dtypes.astype(str),
+        'dtype_after': compacted.dtypes.astype(str),
+        'bytes_before': before,
+        'bytes_after': after,
+    })
+    report['bytes_after'] = report['bytes_after'].fillna(0).astype('int64')
+    return compacted, report.sort_values('bytes_before', ascending=False)
+
+
+@st.cache_resource(max_entries=1, show_spinner="Loading incident data...")
+def load_dataset(path, version):
+    """
+    Loads the dataset once per process and shares it read-only between all sessions.
+    Because the cache keeps a single entry, a new version evicts (and frees) the previous one.
+    :param path: (str) The path to the dataset file.
+    :param version: (tuple) The version tag of the file, used as part of the cache key.
+    :return: (dict) The dataset handle holding the data, its version, load time, memory footprint,
+             statistics catalog and time buckets.
+    """
+    ensure_narrative_store()
+
+    start = time.perf_counter()
+    data, memory_report = compact_frame(read_dataset(path, columns=VIEW_COLUMNS))
+    load_time = time.perf_counter() - start
+
+    memory_bytes = int(data.memory_usage(deep=True).sum())
+    logger.info("Memory used per column:\n%s", memory_report.to_string())
+    logger.info("Loaded %d incidents from %s in %.3fs (%.1f MiB read, %.1f MiB in memory)",
+                len(data), path, load_time, int(memory_report['bytes_before'].sum()) / 2**20, memory_bytes / 2**20)
+
+    return {
+        "data": data,
+        "version": version,
+        "load_time": load_time,
+        "memory_bytes": memory_bytes,
+        "memory_report": memory_report,
+        "catalog": build_catalog(data),
+        "time_buckets": build_time_buckets(data['DATETIME']),
+    }
+
+
+def get_dataset():
+    """
+    Returns the shared dataset handle, reloading it only if the dataset file changed on disk.
+    The returned data is shared by every session and must not be modified in place.
+    :return: (dict) The dataset handle, see load_dataset.
+    """
+    path = dataset_path()
+    return load_dataset(path, dataset_version(path))
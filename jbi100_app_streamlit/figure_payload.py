@@ -0,0 +1,99 @@
+import base64
+import json
+import time
+import numpy as np
+import plotly
+from plotly.utils import PlotlyJSONEncoder
+
+# plotly.py 6+ sends numpy arrays to the browser as base64-encoded typed arrays instead of JSON lists.
+# plotly.py 5 is still supported, as a fallback: figures are then sent as JSON lists, compact_array leaves
+# arrays untouched and map payloads are about twice as large (set REPORT_FIGURE_PAYLOAD=1 to measure them).
+# The mapbox traces used by the map were removed in plotly.py 7, so the app runs on plotly.py 5 or 6.
+TYPED_ARRAYS = int(plotly.__version__.split('.')[0]) >= 6
+
+# numpy dtypes that plotly.js can read as typed arrays, with their plotly.js name
+TYPED_ARRAY_DTYPES = {
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8',
+}
+
+
+def compact_array(values, dtype):
+    """
+    Casts an array to a compact dtype when it is sent as a typed array.
+    With JSON lists, float32 values would print with more digits than the original float64 values,
+    so the array is left as is.
+    :param values: The array.
+    :param dtype: (str) The compact dtype, e.g. 'float32' for coordinates or 'int32' for row ids.
+    :return: (np.ndarray) The array to put in the figure.
+    """
+    values = np.asarray(values)
+    return values.astype(dtype) if TYPED_ARRAYS else values
+
+
+def typed_array_spec(values):
+    """
+    Encodes a numeric array as a plotly.js typed array spec.
+    :param values: (np.ndarray) The array.
+    :return: (dict) The spec, or None if plotly.js has no typed array for the dtype.
+    """
+    if values.dtype == np.int64 and (values.size == 0 or np.abs(values).max() < 2 ** 31):
+        values = values.astype(np.int32)
+    if values.dtype.name not in TYPED_ARRAY_DTYPES:
+        return None
+
+    spec = {
+        "dtype": TYPED_ARRAY_DTYPES[values.dtype.name],
+        "bdata": base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii'),
+    }
+    if values.ndim > 1:
+        spec["shape"] = str(values.shape)[1:-1]
+    return spec
+
+
+def encode_arrays(obj, typed):
+    """
+    Recursively replaces the numpy arrays of a figure dict by JSON lists or typed array specs.
+    :param obj: The figure dict, or a value inside it.
+    :param typed: (bool) Whether to use typed array specs where possible.
+    :return: The encoded value.
+    """
+    if isinstance(obj, np.ndarray):
+        spec = typed_array_spec(obj) if typed else None
+        return spec if spec is not None else obj.tolist()
+    if isinstance(obj, dict):
+        return {key: encode_arrays(value, typed) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [encode_arrays(value, typed) for value in obj]
+    return obj
+
+
+def payload_report(fig):
+    """
+    Measures the size and the encoding time of a figure sent with JSON lists and with typed arrays.
+    Rendering time is spent in the browser and is not measured here.
+    :param fig: The Plotly figure.
+    :return: (dict) The bytes and seconds taken by both encodings.
+    """
+    figure = fig.to_plotly_json()
+    report = {}
+    for name, typed in [("lists", False), ("typed", True)]:
+        start = time.perf_counter()
+        payload = json.dumps(encode_arrays(figure, typed), cls=PlotlyJSONEncoder)
+        report[f"{name}_seconds"] = time.perf_counter() - start
+        report[f"{name}_bytes"] = len(payload.encode('utf-8'))
+    return report
+
+
+def log_payload(name, fig):
+    """
+    Prints the payload report of a figure.
+    :param name: (str) The name of the figure.
+    :param fig: The Plotly figure.
+    """
+    report = payload_report(fig)
+    print(f"{name} figure: {report['lists_bytes'] / 1024:.0f} KiB as JSON lists "
+          f"({report['lists_seconds'] * 1000:.1f} ms), {report['typed_bytes'] / 1024:.0f} KiB as typed arrays "
+          f"({report['typed_seconds'] * 1000:.1f} ms), "
+          f"{report['lists_bytes'] / max(report['typed_bytes'], 1):.1f}x smaller"
+          f"{'' if TYPED_ARRAYS else ' (typed arrays need plotly 6+, currently sending JSON lists)'}")
@@ -0,0 +1,337 @@
+import numpy as np
+import pandas as pd
+
+# Columns filtered by a [min, max] range, answered with a sorted index and searchsorted
+RANGE_COLUMNS = ['DATETIME', 'TEMP', 'TRNSPD', 'ACCDMG', 'TOTKLD', 'TOTINJ']
+
+# Columns filtered by a set of codes, answered with one packed bitmap per code
+CODE_COLUMNS = ['TYPE', 'VISIBLTY', 'WEATHER', 'TYPTRK', 'STATE']
+
+
+def column_values(series):
+    """
+    Returns the values of a column as a numeric array that can be sorted and searched.
+    Datetimes are represented by their nanoseconds since the epoch.
+    :param series: (pd.Series) The column.
+    :return: (tuple) The numeric values and a boolean array flagging the rows with a value.
+    """
+    valid = series.notna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype='datetime64[ns]').view('int64'), valid
+    return series.to_numpy(dtype='float64', na_value=np.nan), valid
+
+
+def bound_value(value):
+    """
+    Converts a range bound to the representation used by column_values.
+    :param value: The bound, either a number or a date/datetime.
+    :return: The bound as a number.
+    """
+    if isinstance(value, (int, float, np.number)):
+        return value
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+def day_bounds(start_date, end_date):
+    """
+    Returns the instants covered by a range of whole days, e.g. the dates picked in the sidebar.
+    :param start_date: The first day, a date or datetime (its time of day is ignored).
+    :param end_date: The last day, included up to its last nanosecond.
+    :return: (tuple) The first and last instants, as pd.Timestamp.
+    """
+    start = pd.Timestamp(start_date).normalize().as_unit('ns')
+    end = pd.Timestamp(end_date).normalize().as_unit('ns') + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+    return start, end
+
+
+def build_filter_index(data):
+    """
+    Precomputes the structures used to answer filter specs on a dataset.
+    For every range column, the row numbers sorted by value (rows without a value left out),
+    and for every code column, one packed bitmap per distinct code.
+    :param data: (pd.DataFrame) The dataset.
+    :return: (dict) The filter index.
+    """
+    size = len(data)
+    index = {"size": size, "ranges": {}, "codes": {}}
+
+    for column in RANGE_COLUMNS:
+        values, valid = column_values(data[column])
+        rows = np.flatnonzero(valid)
+        order = rows[np.argsort(values[rows], kind='stable')]
+        index["ranges"][column] = {
+            "order": order,
+            "sorted_values": values[order],
+            "missing": np.flatnonzero(~valid),
+        }
+
+    for column in CODE_COLUMNS:
+        codes = data[column].to_numpy()
+        valid = data[column].notna().to_numpy()
+        index["codes"][column] = {
+            "bitmaps": {code.item(): np.packbits(codes == code) for code in np.unique(codes[valid])},
+            "complete": bool(valid.all()),
+        }
+
+    return index
+
+
+def range_bitmap(index, column, low, high):
+    """
+    Returns the packed bitmap of the rows whose value lies in [low, high].
+    :param index: (dict) The filter index.
+    :param column: (str) The range column.
+    :param low: The lower bound (inclusive).
+    :param high: The upper bound (inclusive).
+    :return: (np.ndarray) The packed bitmap, or None if every row matches.
+    """
+    size = index["size"]
+    column_index = index["ranges"][column]
+    order = column_index["order"]
+    start = np.searchsorted(column_index["sorted_values"], bound_value(low), side='left')
+    end = np.searchsorted(column_index["sorted_values"], bound_value(high), side='right')
+
+    if start == 0 and end == len(order) == size:
+        return None
+
+    # Write whichever side touches fewer rows: the matching slice or its complement
+    if end - start <= size // 2:
+        mask = np.zeros(size, dtype=bool)
+        mask[order[start:end]] = True
+    else:
+        mask = np.ones(size, dtype=bool)
+        mask[order[:start]] = False
+        mask[order[end:]] = False
+        mask[column_index["missing"]] = False
+    return np.packbits(mask)
+
+
+def code_bitmap(index, column, codes):
+    """
+    Returns the packed bitmap of the rows whose code is one of the given codes.
+    :param index: (dict) The filter index.
+    :param column: (str) The code column.
+    :param codes: (list) The accepted codes.
+    :return: (np.ndarray) The packed bitmap, or None if every row matches.
+    """
+    column_index = index["codes"][column]
+    bitmaps = column_index["bitmaps"]
+    selected = set(codes)
+
+    if column_index["complete"] and selected.issuperset(bitmaps):
+        return None
+
+    # OR together whichever side has fewer bitmaps: the accepted codes or the rejected ones
+    rejected = [code for code in bitmaps if code not in selected]
+    accepted = [code for code in bitmaps if code in selected]
+    if column_index["complete"] and len(rejected) < len(accepted):
+        result = np.zeros((index["size"] + 7) // 8, dtype=np.uint8)
+        for code in rejected:
+            np.bitwise_or(result, bitmaps[code], out=result)
+        return np.invert(result, out=result)
+
+    result = np.zeros((index["size"] + 7) // 8, dtype=np.uint8)
+    for code in accepted:
+        np.bitwise_or(result, bitmaps[code], out=result)
+    return result
+
+
+def predicate_bitmap(index, kind, column, params):
+    """
+    Returns the packed bitmap of a single predicate of a filter spec.
+    :param index: (dict) The filter index.
+    :param kind: (str) Either "ranges" or "codes".
+    :param column: (str) The filtered column.
+    :param params: The (low, high) bounds for a range, or the accepted codes.
+    :return: (np.ndarray) The packed bitmap, or None if every row matches.
+    """
+    if kind == "ranges":
+        return range_bitmap(index, column, params[0], params[1])
+    return code_bitmap(index, column, params)
+
+
+def combine_bitmaps(index, bitmaps):
+    """
+    ANDs packed bitmaps together, None standing for a bitmap that matches every row.
+    :param index: (dict) The filter index.
+    :param bitmaps: (list) The packed bitmaps.
+    :return: (np.ndarray) The combined packed bitmap, or None if every row matches.
+    """
+    result = None
+    for bitmap in bitmaps:
+        if bitmap is None:
+            continue
+        if result is None:
+            result = bitmap.copy()
+        else:
+            np.bitwise_and(result, bitmap, out=result)
+    return result
+
+
+def bitmap_to_mask(index, bitmap):
+    """
+    Unpacks a packed bitmap into a boolean mask with one entry per row.
+    :param index: (dict) The filter index.
+    :param bitmap: (np.ndarray) The packed bitmap, or None if every row matches.
+    :return: (np.ndarray) The boolean mask.
+    """
+    if bitmap is None:
+        return np.ones(index["size"], dtype=bool)
+    return np.unpackbits(bitmap, count=index["size"]).view(bool)
+
+
+def query_bitmap(index, spec):
+    """
+    Answers a filter spec with the precomputed index.
+    A spec is a dict with a "ranges" dict mapping columns to (low, high) bounds
+    and a "codes" dict mapping columns to the accepted codes.
+    :param index: (dict) The filter index.
+    :param spec: (dict) The filter spec.
+    :return: (np.ndarray) The packed bitmap of the matching rows, or None if every row matches.
+    """
+    return combine_bitmaps(index, [
+        predicate_bitmap(index, kind, column, params)
+        for kind in ("ranges", "codes")
+        for column, params in spec.get(kind, {}).items()
+    ])
+
+
+def predicate_key(kind, params):
+    """
+    Returns a hashable form of a predicate's parameters, used to detect when they change.
+    :param kind: (str) Either "ranges" or "codes".
+    :param params: The (low, high) bounds for a range, or the accepted codes.
+    :return: The hashable parameters.
+    """
+    if kind == "ranges":
+        return (bound_value(params[0]), bound_value(params[1]))
+    return frozenset(params)
+
+
+def normalize_spec(spec):
+    """
+    Returns a hashable form of a filter spec, equal for specs that select the same rows
+    regardless of the order of their predicates and codes or of the types of their bounds.
+    :param spec: (dict) The filter spec.
+    :return: (tuple) The normalized spec.
+    """
+    return tuple(sorted(
+        (kind, column, predicate_key(kind, params))
+        for kind in ("ranges", "codes")
+        for column, params in spec.get(kind, {}).items()
+    ))
+
+
+def incremental_query_bitmap(index, spec, cache):
+    """
+    Answers a filter spec like query_bitmap, reusing the work of the previous call.
+    The bitmap of every predicate is kept in the cache with its parameters, so only the predicates
+    whose parameters changed are evaluated again. When a single predicate changes, the AND of all
+    the other predicates is kept as well, so that repeated changes of the same predicate (e.g. while
+    dragging a slider) cost one predicate evaluation and one AND.
+    :param index: (dict) The filter index.
+    :param spec: (dict) The filter spec.
+    :param cache: (dict) The cache, kept between calls with the same index (e.g. in the session state).
+    :return: (np.ndarray) The packed bitmap of the matching rows, or None if every row matches.
+    """
+    parts = cache.setdefault("parts", {})
+    predicates = {
+        (kind, column): params
+        for kind in ("ranges", "codes")
+        for column, params in spec.get(kind, {}).items()
+    }
+
+    changed = [key for key in parts if key not in predicates]
+    for key in changed:
+        del parts[key]
+    for (kind, column), params in predicates.items():
+        params_key = predicate_key(kind, params)
+        cached = parts.get((kind, column))
+        if cached is None or cached[0] != params_key:
+            parts[(kind, column)] = (params_key, predicate_bitmap(index, kind, column, params))
+            changed.append((kind, column))
+
+    if not changed and "combined" in cache:
+        return cache["combined"]
+
+    if len(changed) == 1 and changed[0] in parts:
+        key = changed[0]
+        if cache.get("rest_key") != key:
+            cache["rest_key"] = key
+            cache["rest"] = combine_bitmaps(index, [bitmap for other, (_, bitmap) in parts.items() if other != key])
+        cache["combined"] = combine_bitmaps(index, [cache["rest"], parts[key][1]])
+    else:
+        cache["rest_key"] = None
+        cache["rest"] = None
+        cache["combined"] = combine_bitmaps(index, [bitmap for _, bitmap in parts.values()])
+    return cache["combined"]
+
+
+def build_row_groups(series):
+    """
+    Groups the rows of a column by value: the row numbers sorted by value, and where the rows of every
+    distinct value start and end, so the rows of any set of values are a few slices.
+    :param series: (pd.Series) The column.
+    :return: (dict) The distinct "values" (rows without a value left out), the "order", "starts" and "ends"
+             of their rows, and the group "codes" of every row (-1 for rows without a value).
+    """
+    values, valid = column_values(series)
+    rows = np.flatnonzero(valid)
+    order = rows[np.argsort(values[rows], kind='stable')]
+    distinct, starts = np.unique(values[order], return_index=True)
+    ends = np.append(starts[1:], len(order)) if len(starts) > 0 else starts
+
+    codes = np.full(len(values), -1, dtype=np.int32)
+    codes[order] = np.repeat(np.arange(len(distinct), dtype=np.int32), ends - starts)
+    return {
+        "values": distinct,
+        "order": order,
+        "starts": starts,
+        "ends": ends,
+        "codes": codes,
+    }
+
+
+def group_positions(groups, values):
+    """
+    Returns the groups of the given values.
+    :param groups: (dict) The row groups of the column, see build_row_groups.
+    :param values: (list) The values, matched up to float32 precision.
+    :return: (np.ndarray) The sorted positions of the matched groups.
+    """
+    if len(groups["values"]) == 0:
+        return np.empty(0, dtype=np.int64)
+    values = np.asarray(values, dtype=groups["values"].dtype)
+    positions = np.clip(np.searchsorted(groups["values"], values), 0, len(groups["values"]) - 1)
+    return np.unique(positions[np.isclose(groups["values"][positions], values, rtol=1e-6)])
+
+
+def group_slices(groups, positions):
+    """
+    Returns the rows of the given groups.
+    :param groups: (dict) The row groups of the column, see build_row_groups.
+    :param positions: (np.ndarray) The positions of the groups.
+    :return: (np.ndarray) The row numbers, in group order.
+    """
+    slices = [groups["order"][groups["starts"][i]:groups["ends"][i]] for i in positions]
+    return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+
+def query_mask(index, spec):
+    """
+    Answers a filter spec with a boolean mask, see query_bitmap.
+    :param index: (dict) The filter index.
+    :param spec: (dict) The filter spec.
+    :return: (np.ndarray) The boolean mask of the matching rows.
+    """
+    return bitmap_to_mask(index, query_bitmap(index, spec))
+
+
+def query_rows(index, spec):
+    """
+    Answers a filter spec with row numbers, see query_bitmap.
+    :param index: (dict) The filter index.
+    :param spec: (dict) The filter spec.
+    :return: (np.ndarray) The sorted row numbers of the matching rows.
+    """
+    return np.flatnonzero(query_mask(index, spec))
@@ -2,13 +2,16 @@ import pandas as pd
 from constants import STATE_CODES, TYPE_DESCRIPTIONS, VIS_DESCRIPTIONS, WEATHER_DESCRIPTIONS, TRACK_DESCRIPTIONS, INJURED_BUCKETS, COSTS_BUCKETS
 import streamlit as st
 import math
+from filter_engine import build_filter_index, incremental_query_bitmap, bitmap_to_mask, normalize_spec, day_bounds
+from result_cache import get_result_cache, cached_result
 
 
 def filter_by_date(data, start_date, end_date):
     """Filter map data based on selected date range."""
+    start, end = day_bounds(start_date, end_date)
     return data[
-        (data['DATETIME'] >= pd.to_datetime(start_date)) &
-        (data['DATETIME'] <= pd.to_datetime(end_date))
+        (data['DATETIME'] >= start) &
+        (data['DATETIME'] <= end)
     ]
 
 
@@ -59,7 +62,7 @@ def filter_by_region(data, region):
         return data[~((data['Latitude'] > 50) & (data['Longitude'] < -130))]
 
 
-def bucket_to_numeric(bucket, data):
+def bucket_to_numeric(bucket, catalog):
     if bucket == "0":
         return 0
     elif bucket == "0.25 million":
@@ -77,38 +80,52 @@ def bucket_to_numeric(bucket, data):
     elif bucket == "20 million":
         return 20000000
     elif bucket == "20+ million":
-        return int(math.ceil(data['ACCDMG'].max()))
+        return int(math.ceil(catalog['columns']['ACCDMG']['max']))
     
 
-def bucket_to_numeric_injured(bucket, data):
+def bucket_to_numeric_injured(bucket, catalog):
     if bucket == "100+":
-        return int(math.ceil(data['TOTINJ'].max()))  # Use infinity for open-ended range
+        return int(math.ceil(catalog['columns']['TOTINJ']['max']))  # Use infinity for open-ended range
     return bucket  # Return numeric values as is
 
 
-def setup_filters(map_data):
+@st.cache_resource(max_entries=1)
+def get_filter_index(_data, version):
+    """
+    Builds the filter index of the dataset once per dataset version, shared by all sessions.
+    :param _data: (pd.DataFrame) The dataset (not hashed by Streamlit, the version identifies it).
+    :param version: (tuple) The dataset version.
+    :return: (dict) The filter index, see filter_engine.build_filter_index.
+    """
+    return build_filter_index(_data)
+
+
+def setup_filters(map_data, data_version, catalog):
     st.sidebar.header("Filters")
 
+    # Widget bounds are read from the statistics catalog of the dataset instead of scanning it
+    stats = catalog['columns']
+
     # Date filters
     start_date = st.sidebar.date_input(
         "Start Date",
-        map_data['DATETIME'].min().date(),
-        min_value=map_data['DATETIME'].min().date(),
-        max_value=map_data['DATETIME'].max().date()
+        stats['DATETIME']['min'].date(),
+        min_value=stats['DATETIME']['min'].date(),
+        max_value=stats['DATETIME']['max'].date()
     )
     end_date = st.sidebar.date_input(
         "End Date",
-        map_data['DATETIME'].max().date(),
-        min_value=map_data['DATETIME'].min().date(),
-        max_value=map_data['DATETIME'].max().date()
+        stats['DATETIME']['max'].date(),
+        min_value=stats['DATETIME']['min'].date(),
+        max_value=stats['DATETIME']['max'].date()
     )
 
     if start_date > end_date:
         return "Start date cannot be after end date." # Error message
     
     # Temperature Slider
-    min_temp = int(math.floor(map_data['TEMP'].min()))
-    max_temp = int(math.ceil(map_data['TEMP'].max()))
+    min_temp = int(math.floor(stats['TEMP']['min']))
+    max_temp = int(math.ceil(stats['TEMP']['max']))
     temp_range = st.sidebar.slider(
             "Temperature Range (F)",
             min_value=min_temp,
@@ -118,8 +135,8 @@ def setup_filters(map_data):
         )
     
     # Speed Slider
-    min_speed = int(math.floor(map_data['TRNSPD'].min()))
-    max_speed = int(math.ceil(map_data['TRNSPD'].max()))
+    min_speed = int(math.floor(stats['TRNSPD']['min']))
+    max_speed = int(math.ceil(stats['TRNSPD']['max']))
     speed_range = st.sidebar.slider(
             "Speed Range (mph)",
             min_value=min_speed,
@@ -129,8 +146,8 @@ def setup_filters(map_data):
         )
     
     # Kill Slider
-    min_kill = int(math.floor(map_data['TOTKLD'].min()))
-    max_kill = int(math.ceil(map_data['TOTKLD'].max()))
+    min_kill = int(math.floor(stats['TOTKLD']['min']))
+    max_kill = int(math.ceil(stats['TOTKLD']['max']))
     kill_range = st.sidebar.slider(
             "Total People Killed",
             min_value=min_kill,
@@ -140,16 +157,14 @@ def setup_filters(map_data):
         )
 
     # Sidebar slider for Damage Costs
-    min_costs = int(math.floor(map_data['ACCDMG'].min()))
-    max_costs = int(math.ceil(map_data['ACCDMG'].max()))
     cost_range = st.sidebar.select_slider(
         "Select Damage Cost Range:",
         options=COSTS_BUCKETS,
         value=(COSTS_BUCKETS[0], COSTS_BUCKETS[-1]), # Default to full range
         format_func=lambda x: x
         )
-    min_costs = bucket_to_numeric(cost_range[0], map_data)
-    max_costs = bucket_to_numeric(cost_range[1], map_data)
+    min_costs = bucket_to_numeric(cost_range[0], catalog)
+    max_costs = bucket_to_numeric(cost_range[1], catalog)
 
     # Sidebar slider for Total Injured
     inj_range = st.sidebar.select_slider(
@@ -158,8 +173,8 @@ def setup_filters(map_data):
         value=(INJURED_BUCKETS[0], INJURED_BUCKETS[-1]), # Default to full range
         format_func=lambda x: str(x)
         )
-    min_inj = bucket_to_numeric_injured(inj_range[0], map_data)
-    max_inj = bucket_to_numeric_injured(inj_range[1], map_data)
+    min_inj = bucket_to_numeric_injured(inj_range[0], catalog)
+    max_inj = bucket_to_numeric_injured(inj_range[1], catalog)
 
     # Incident Type filters
     with st.sidebar.expander("Incident Types", expanded=False):
@@ -286,39 +301,42 @@ def setup_filters(map_data):
 
     # Apply filters
     reverse_state_codes = {v: k for k, v in STATE_CODES.items()}
-    selected_filter = (
-        (map_data['DATETIME'] >= pd.to_datetime(start_date)) &
-        (map_data['DATETIME'] <= pd.to_datetime(end_date)) &
-        (map_data['TEMP']>= temp_range[0]) & 
-        (map_data['TEMP'] <= temp_range[1]) &
-        (map_data['TRNSPD'] >= speed_range[0]) &
-        (map_data['TRNSPD'] <= speed_range[1]) &
-        (map_data['ACCDMG'] >= min_costs) &
-        (map_data['ACCDMG'] <= max_costs) &
-        (map_data['TOTKLD'] >= kill_range[0]) &
-        (map_data['TOTKLD'] <= kill_range[1]) &
-        (map_data['TOTINJ'] >= min_inj) & 
-        (map_data['TOTINJ'] <= max_inj) &
-        (map_data['TYPE'].isin(
-            [int(code) for code, description in TYPE_DESCRIPTIONS.items()
-             if selected_types.get(description, False)]
-        )) &
-        (map_data['VISIBLTY'].isin(
-            [int(code) for code, description in VIS_DESCRIPTIONS.items()
-             if selected_vis.get(description, False)]
-        )) &
-        (map_data['WEATHER'].isin(
-            [int(code) for code, description in WEATHER_DESCRIPTIONS.items()
-             if selected_weather.get(description, False)]
-        )) &
-        (map_data['TYPTRK'].isin(
-            [int(code) for code, description in TRACK_DESCRIPTIONS.items()
-             if selected_track.get(description, False)]
-        )) &
-        (map_data['STATE'].isin(
-            [reverse_state_codes[state]
-                for state, selected in selected_states.items() if selected]
-        ))   
+    filter_spec = {
+        "ranges": {
+            "DATETIME": day_bounds(start_date, end_date),  # The end date is included up to the end of the day
+            "TEMP": temp_range,
+            "TRNSPD": speed_range,
+            "ACCDMG": (min_costs, max_costs),
+            "TOTKLD": kill_range,
+            "TOTINJ": (min_inj, max_inj),
+        },
+        "codes": {
+            "TYPE": [int(code) for code, description in TYPE_DESCRIPTIONS.items()
+                     if selected_types.get(description, False)],
+            "VISIBLTY": [int(code) for code, description in VIS_DESCRIPTIONS.items()
+                         if selected_vis.get(description, False)],
+            "WEATHER": [int(code) for code, description in WEATHER_DESCRIPTIONS.items()
+                        if selected_weather.get(description, False)],
+            "TYPTRK": [int(code) for code, description in TRACK_DESCRIPTIONS.items()
+                       if selected_track.get(description, False)],
+            "STATE": [reverse_state_codes[state]
+                      for state, selected in selected_states.items() if selected],
+        },
+    }
+
+    filter_index = get_filter_index(map_data, data_version)
+
+    # Filter results are shared by all sessions, keyed by the normalized spec. On a miss, predicate bitmaps
+    # are cached per session, so a rerun only re-evaluates the filters that changed
+    if st.session_state.get('filter_cache', {}).get('version') != data_version:
+        st.session_state.filter_cache = {'version': data_version}
+    st.session_state.filter_spec = filter_spec
+    st.session_state.filter_key = (data_version, normalize_spec(filter_spec))
+    bitmap = cached_result(
+        get_result_cache(),
+        ("filter", st.session_state.filter_key),
+        lambda: incremental_query_bitmap(filter_index, filter_spec, st.session_state.filter_cache)
     )
+    selected_filter = pd.Series(bitmap_to_mask(filter_index, bitmap), index=map_data.index)
 
     return selected_filter
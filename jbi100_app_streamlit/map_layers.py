@@ -0,0 +1,210 @@
+import numpy as np
+
+# Width in pixels of a map tile at zoom level 0, used to convert zoom levels to degrees
+TILE_SIZE = 512
+
+
+def grid_cell_size(zoom, cell_pixels):
+    """
+    Returns the size of a grid cell, in degrees, that appears cell_pixels wide at the given zoom level.
+    :param zoom: (float) The map zoom level.
+    :param cell_pixels: (int) The wanted on-screen size of a cell, in pixels.
+    :return: (float) The cell size in degrees.
+    """
+    return 360 / (TILE_SIZE * 2 ** zoom) * cell_pixels
+
+
+def grid_cell_keys(lat, lon, cell_size):
+    """
+    Returns the key of the grid cell containing every point.
+    :param lat: (np.ndarray) The latitudes of the points.
+    :param lon: (np.ndarray) The longitudes of the points.
+    :param cell_size: (float) The cell size in degrees.
+    :return: (np.ndarray) The int64 cell key of every point.
+    """
+    columns = int(np.ceil(360 / cell_size)) + 1
+    row = np.floor((np.asarray(lat, dtype=np.float64) + 90) / cell_size).astype(np.int64)
+    column = np.floor((np.asarray(lon, dtype=np.float64) + 180) / cell_size).astype(np.int64)
+    return row * columns + column
+
+
+def aggregate_grid(lat, lon, cell_size, measures=None):
+    """
+    Bins points into a regular grid and summarizes every non-empty cell.
+    :param lat: (np.ndarray) The latitudes of the points.
+    :param lon: (np.ndarray) The longitudes of the points.
+    :param cell_size: (float) The cell size in degrees.
+    :param measures: (dict) Optional measure name -> values of every point, summed per cell (missing values ignored).
+    :return: (dict) The cell "keys", the centroid "lat"/"lon" of the points in each cell,
+             the "counts" and a "sums" dict with the per-cell sum of every measure.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    keys, inverse, counts = np.unique(grid_cell_keys(lat, lon, cell_size), return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+
+    sums = {}
+    for name, values in (measures or {}).items():
+        values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+        sums[name] = np.bincount(inverse, weights=values, minlength=len(keys))
+
+    return {
+        "keys": keys,
+        "lat": np.bincount(inverse, weights=lat, minlength=len(keys)) / counts,
+        "lon": np.bincount(inverse, weights=lon, minlength=len(keys)) / counts,
+        "counts": counts,
+        "sums": sums,
+    }
+
+
+def gaussian_kernel_matrix(size, bandwidth):
+    """
+    Returns the matrix that smooths a vector of grid values with a Gaussian kernel.
+    :param size: (int) The number of grid cells along the axis.
+    :param bandwidth: (float) The standard deviation of the kernel, in cells.
+    :return: (np.ndarray) The size x size smoothing matrix.
+    """
+    offsets = np.arange(size)
+    distances = offsets[:, None] - offsets[None, :]
+    return np.exp(-0.5 * (distances / bandwidth) ** 2)
+
+
+def kernel_density(lat, lon, bounds, cell_size, bandwidth):
+    """
+    Estimates the density of points on a regular grid covering the bounds.
+    The points are binned into the grid and the counts are smoothed with a separable Gaussian
+    kernel, applied as one matrix product along each axis.
+    :param lat: (np.ndarray) The latitudes of the points.
+    :param lon: (np.ndarray) The longitudes of the points.
+    :param bounds: (dict) The "lat" and "lon" [min, max] ranges covered by the grid.
+    :param cell_size: (float) The cell size in degrees.
+    :param bandwidth: (float) The standard deviation of the kernel, in cells.
+    :return: (dict) The "lat"/"lon" centers of the cells with a non-negligible density and their "density",
+             normalized so that the densest cell is 1.
+    """
+    (lat_min, lat_max), (lon_min, lon_max) = bounds["lat"], bounds["lon"]
+    lat_edges = np.arange(lat_min, lat_max + cell_size, cell_size)
+    lon_edges = np.arange(lon_min, lon_max + cell_size, cell_size)
+    counts, _, _ = np.histogram2d(lat, lon, bins=[lat_edges, lon_edges])
+
+    density = gaussian_kernel_matrix(len(lat_edges) - 1, bandwidth) @ counts @ gaussian_kernel_matrix(len(lon_edges) - 1, bandwidth)
+    peak = density.max() if density.size > 0 else 0
+    if peak > 0:
+        density /= peak
+
+    # Cells far from any point are left out, so only the populated part of the grid is sent
+    rows, columns = np.nonzero(density > 1e-3)
+    return {
+        "lat": lat_edges[rows] + cell_size / 2,
+        "lon": lon_edges[columns] + cell_size / 2,
+        "density": density[rows, columns],
+    }
+
+
+def build_spatial_index(lat, lon, cell_size):
+    """
+    Builds a grid spatial index: the rows sorted by the key of the grid cell they fall in,
+    so that the rows of a band of adjacent cells form one contiguous slice.
+    :param lat: (np.ndarray) The latitudes of the points.
+    :param lon: (np.ndarray) The longitudes of the points.
+    :param cell_size: (float) The cell size in degrees.
+    :return: (dict) The spatial index.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    keys = grid_cell_keys(lat, lon, cell_size)
+    order = np.argsort(keys, kind='stable')
+    return {
+        "cell_size": cell_size,
+        "columns": int(np.ceil(360 / cell_size)) + 1,
+        "keys": keys[order],
+        "order": order,
+        "lat": lat,
+        "lon": lon,
+    }
+
+
+def query_viewport(index, bounds):
+    """
+    Returns the rows whose point lies within the given bounds.
+    Only the cells overlapping the bounds are visited: one searchsorted per band of cells.
+    :param index: (dict) The spatial index.
+    :param bounds: (dict) The "lat" and "lon" [min, max] ranges of the viewport.
+    :return: (np.ndarray) The sorted row numbers inside the bounds.
+    """
+    cell_size = index["cell_size"]
+    (lat_min, lat_max), (lon_min, lon_max) = bounds["lat"], bounds["lon"]
+    first_row, last_row = (int(np.floor((value + 90) / cell_size)) for value in (lat_min, lat_max))
+    first_column, last_column = (int(np.floor((value + 180) / cell_size)) for value in (lon_min, lon_max))
+
+    slices = []
+    for row in range(first_row, last_row + 1):
+        start = np.searchsorted(index["keys"], row * index["columns"] + first_column, side='left')
+        end = np.searchsorted(index["keys"], row * index["columns"] + last_column, side='right')
+        slices.append(index["order"][start:end])
+    candidates = np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    lat = index["lat"][candidates]
+    lon = index["lon"][candidates]
+    inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+    return np.sort(candidates[inside])
+
+
+def downsample(rows, budget, seed=0):
+    """
+    Keeps at most budget rows, drawn uniformly at random with a fixed seed so the
+    same rows are kept from one rerun to the next.
+    :param rows: (np.ndarray) The sorted row numbers.
+    :param budget: (int) The maximum number of rows to keep.
+    :param seed: (int) The seed of the random generator.
+    :return: (np.ndarray) The sorted kept row numbers.
+    """
+    if len(rows) <= budget:
+        return rows
+    return np.sort(np.random.default_rng(seed).choice(rows, size=budget, replace=False))
+
+
+def screen_bounds(center, zoom, pixels, margin=0.0):
+    """
+    Returns the area shown by a Web Mercator map of the given size, centered and zoomed as given.
+    :param center: (dict) The "lat"/"lon" center of the map.
+    :param zoom: (float) The map zoom level.
+    :param pixels: (tuple) The width and height of the map, in pixels.
+    :param margin: (float) The margin added on every side, as a fraction of the width and height.
+    :return: (dict) The "lat"/"lon" bounds of the area.
+    """
+    width, height = pixels[0] * (1 + 2 * margin), pixels[1] * (1 + 2 * margin)
+    world = TILE_SIZE * 2 ** zoom  # Width of the whole world in pixels
+    half_lon = width / world * 180
+    y = np.log(np.tan(np.pi / 4 + np.radians(center["lat"]) / 2))
+    half_y = height / world * np.pi
+    lat_min = np.degrees(2 * np.arctan(np.exp(y - half_y)) - np.pi / 2)
+    lat_max = np.degrees(2 * np.arctan(np.exp(y + half_y)) - np.pi / 2)
+    return {
+        "lat": [float(max(lat_min, -85)), float(min(lat_max, 85))],
+        "lon": [float(max(center["lon"] - half_lon, -180)), float(min(center["lon"] + half_lon, 180))],
+    }
+
+
+def fit_bounds(lat, lon, pixels, padding=0.1, margin=0.0):
+    """
+    Returns the view that fits a set of points.
+    The bounds of the view are the whole area shown at the chosen zoom level, not only the extent of the points.
+    :param lat: (np.ndarray) The latitudes of the points.
+    :param lon: (np.ndarray) The longitudes of the points.
+    :param pixels: (tuple) The width and height of the map, in pixels.
+    :param padding: (float) The margin added around the points, as a fraction of their extent.
+    :param margin: (float) The margin added around the shown area, see screen_bounds.
+    :return: (dict) The "lat"/"lon" bounds, the "center" and the "zoom" level of the view.
+    """
+    lat_min, lat_max = float(np.min(lat)), float(np.max(lat))
+    lon_min, lon_max = float(np.min(lon)), float(np.max(lon))
+    lat_pad = max((lat_max - lat_min) * padding, 0.01)
+    lon_pad = max((lon_max - lon_min) * padding, 0.01)
+
+    # Zoom level at which the padded points fill the map, whichever side is limiting
+    lon_zoom = np.log2(pixels[0] * 360 / (TILE_SIZE * (lon_max - lon_min + 2 * lon_pad)))
+    lat_zoom = np.log2(pixels[1] * 180 / (TILE_SIZE * (lat_max - lat_min + 2 * lat_pad)))
+    center = {"lat": (lat_min + lat_max) / 2, "lon": (lon_min + lon_max) / 2}
+    zoom = float(np.clip(min(lon_zoom, lat_zoom), 1, 16))
+    return dict(screen_bounds(center, zoom, pixels, margin), center=center, zoom=zoom)
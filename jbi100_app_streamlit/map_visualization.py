@@ -1,14 +1,26 @@
+import hashlib
+import logging
 import streamlit as st
 import plotly.express as px
 import pandas as pd
-import json
+import numpy as np
 from datetime import date
-from config import DATA_PATH, MAP_CONFIGS, MAPBOX_ACCESS_TOKEN, DEFAULT_STYLE
-from constants import STATE_CODES, VARNAMES_TO_DATASET, TYPE_DESCRIPTIONS, VIS_DESCRIPTIONS, WEATHER_DESCRIPTIONS, TRACK_DESCRIPTIONS, PLOT_FUNCTIONS
-from plots import parallel_plot
+from config import MAP_CONFIGS, MAPBOX_ACCESS_TOKEN, DEFAULT_STYLE, MAP_MODES, MAP_POINT_BUDGET, MAP_DENSITY_THRESHOLD, GRID_CELL_PIXELS, SPATIAL_INDEX_CELL_SIZE, DENSITY_CELL_PIXELS, DENSITY_BANDWIDTH, MAP_VIEWPORT_PIXELS, MAP_VIEW_MARGIN, REPORT_FIGURE_PAYLOAD
+from constants import STATE_CODES, VARNAMES_TO_DATASET, DESCRIPTION_CODES, PLOT_FUNCTIONS, plot_bar_chart, plot_year_month_heatmap
+from crossfilter import new_crossfilter, add_dimension, remove_dimension, filter_mask, filter_values, filter_all, is_filtered, passing_mask, passing_rows, group_counts, group_means
+from cube import CUBE_DIMENSIONS, CUBE_MEASURES, build_cube, filtered_rollup
+from dataset import get_dataset
+from filter_engine import build_row_groups
+from filters import get_filter_index
+from figure_payload import compact_array, log_payload
+from map_layers import grid_cell_size, grid_cell_keys, aggregate_grid, build_spatial_index, query_viewport, downsample, fit_bounds, kernel_density
+from narratives import read_narrative
+from time_buckets import bucket_counts, row_keys
+from plots import parallel_plot, get_bins
+from result_cache import get_result_cache, cached_result
+
+logger = logging.getLogger(__name__)
 
-selected_data = None
-unselected_data = None
 
 def create_base_figure():
     """
@@ -39,13 +51,15 @@ def create_base_figure():
 
 def initialize_data():
     """
-    Initializes and loads the map data into the session state.
-    If not already loaded, reads the dataset and converts relevant columns.
+    Attaches the shared dataset to the session state.
+    The session only holds a reference to the process-wide data, which is loaded once
+    and reloaded when the dataset file changes.
     """
-    if 'map_data' not in st.session_state:
-        data = pd.read_csv(DATA_PATH, low_memory=False)
-        data['DATETIME'] = pd.to_datetime(data['DATETIME'])
-        st.session_state.map_data = data
+    dataset = get_dataset()
+    st.session_state.map_data = dataset['data']
+    st.session_state.data_version = dataset['version']
+    st.session_state.data_catalog = dataset['catalog']
+    st.session_state.time_buckets = dataset['time_buckets']
 
 
 def initialize_figure():
@@ -57,6 +71,86 @@ def initialize_figure():
         st.session_state.fig = create_base_figure()
 
 
+def get_crossfilter():
+    """
+    Returns the linked-selection engine of the session, see crossfilter.new_crossfilter.
+    It is created (and recreated when the dataset changes) with a "filters" dimension for the sidebar filters
+    and a "map" dimension for the map selection; the Explore chart registers an "explore" dimension.
+    :return: (dict) The engine.
+    """
+    version = st.session_state.data_version
+    if st.session_state.get('crossfilter_version') != version:
+        crossfilter = new_crossfilter(len(st.session_state.map_data))
+        add_dimension(crossfilter, "filters")
+        add_dimension(crossfilter, "map")
+        st.session_state.crossfilter = crossfilter
+        st.session_state.crossfilter_version = version
+        st.session_state.pop('linked_filter_key', None)
+        st.session_state.pop('explore_dimension', None)
+        st.session_state.pop('map_selection', None)
+    return st.session_state.crossfilter
+
+
+def update_linked_filters(selected_filter):
+    """
+    Brushes the "filters" dimension with the sidebar filters, so every linked view follows them.
+    Only the rows whose filter result changed update the group counts of the other views.
+    :param selected_filter: The filters that the user selected.
+    """
+    crossfilter = get_crossfilter()
+    if st.session_state.get('linked_filter_key') != st.session_state.filter_key:
+        filter_mask(crossfilter, "filters", selected_filter.to_numpy())
+        st.session_state.linked_filter_key = st.session_state.filter_key
+
+
+@st.cache_resource(max_entries=1)
+def get_coordinate_index(_data, version):
+    """
+    Builds a hash index on the (Latitude, Longitude) pairs of the dataset, once per dataset version.
+    :param _data: (pd.DataFrame) The dataset (not hashed by Streamlit, the version identifies it).
+    :param version: (tuple) The dataset version.
+    :return: (pd.MultiIndex) The coordinates of every row, in dataset order.
+    """
+    return pd.MultiIndex.from_arrays([_data['Latitude'], _data['Longitude']])
+
+
+def selection_mask(data, points):
+    """
+    Resolves the points selected on the map to the rows of the dataset.
+    Markers carry their row id as customdata and aggregated grid cells their cell key, which selects
+    every row in the cell. Points without customdata (e.g. from an older figure) are matched on their
+    coordinates through the coordinate hash index.
+    :param data: (pd.DataFrame) The dataset containing map data.
+    :param points: (list) The selected points, as reported by st.plotly_chart.
+    :return: (np.ndarray) Boolean mask of the selected rows.
+    """
+    layers = st.session_state.get('map_layers', [])
+    row_ids = []
+    cell_keys = {}
+    coords = []
+    for point in points:
+        customdata = point.get('customdata')
+        if customdata is None:
+            coords.append((point['lat'], point['lon']))
+            continue
+
+        value = customdata[0] if isinstance(customdata, (list, tuple)) else customdata
+        curve_number = point.get('curve_number', 0)
+        layer = layers[curve_number] if curve_number < len(layers) else {"kind": "points"}
+        if layer["kind"] == "cells":
+            cell_keys.setdefault(layer["cell_size"], []).append(value)
+        else:
+            row_ids.append(value)
+
+    mask = data.index.isin(row_ids)
+    for cell_size, keys in cell_keys.items():
+        mask |= np.isin(grid_cell_keys(data['Latitude'].to_numpy(), data['Longitude'].to_numpy(), cell_size), keys)
+    if coords:
+        coordinate_index = get_coordinate_index(data, st.session_state.data_version)
+        mask |= coordinate_index.isin(coords)
+    return mask
+
+
 def map(fig, data, selected_filter):
     """
     Renders the main map figure in Streamlit and updates data based on user interactions (e.g., marker selection).
@@ -64,7 +158,10 @@ def map(fig, data, selected_filter):
     :param data: The dataset containing map data.
     :param selected_filter: The filter applied to the dataset for the map.
     """
-    selected_markers = st.plotly_chart(
+    if REPORT_FIGURE_PAYLOAD:
+        log_payload("Map", st.session_state.fig)
+
+    event = st.plotly_chart(
         st.session_state.fig,
         key="main_map",
         use_container_width=True,
@@ -77,27 +174,25 @@ def map(fig, data, selected_filter):
         class_name="full-screen-map",
         on_select="rerun",
     )
-    selected_markers = json.dumps(selected_markers)
-    
-    if selected_markers:
-        # Extract latitudes and longitudes from selected_markers
-        selection = json.loads(selected_markers)['selection']
-        selected_coords = {
-            (point['lat'], point['lon'])
-            for point in selection['points']
-        }
 
-        global selected_data
-        global unselected_data
+    if event:
+        apply_map_selection(data, event['selection']['points'])
 
-        # Identify rows in the dataset that match selected markers
-        selected_data = data[data.apply(
-            lambda row: (row['Latitude'], row['Longitude']) in selected_coords, axis=1
-        )].copy()
 
-        unselected_data = data[data.apply(
-            lambda row: (row['Latitude'], row['Longitude']) not in selected_coords, axis=1
-        )].copy()
+def apply_map_selection(data, points):
+    """
+    Identifies the rows of the dataset that match the selected markers, and brushes the "map" dimension with them.
+    Like every view state, the selection is kept in the session state, never shared between sessions.
+    :param data: The dataset containing map data.
+    :param points: (list) The selected points, as reported by st.plotly_chart.
+    """
+    mask = selection_mask(data, points) if points else None
+    if mask is not None and mask.any():
+        st.session_state.map_selection = np.flatnonzero(mask)
+    else:
+        mask = None
+        st.session_state.map_selection = np.empty(0, dtype=np.int64)
+    filter_mask(get_crossfilter(), "map", mask)
 
 
 def marker_properties_selected():
@@ -114,130 +209,397 @@ def marker_properties_unselected():
     return dict(size=6, opacity=0.5, color='#FFCCCB')
 
 
-def update_figure_data(fig, data, selected_filter, selected_markers=[]):
+def marker_properties_highlighted():
+    """
+    Returns marker properties for data points highlighted from the Explore chart.
+    """
+    return dict(size=6, opacity=1, color='rgb(255, 255, 0)')  # Brighter yellow
+
+
+def setup_map_controls():
+    """
+    Adds the map display controls to the sidebar.
+    """
+    st.sidebar.radio(
+        "Map Mode",
+        options=MAP_MODES,
+        key="map_mode",
+        horizontal=True,
+        help="Auto shows individual incidents when there are few enough of them, a grid of aggregated cells "
+             "when there are more, and a density heatmap of the filtered incidents when there are many."
+    )
+    col1, col2 = st.sidebar.columns([1, 1])
+    col1.button("Zoom to Selection", on_click=zoom_to_selection, use_container_width=True,
+                help="Fit the map to the incidents selected on it; only incidents in view are drawn.")
+    col2.button("Reset View", on_click=reset_map_view, use_container_width=True)
+
+
+def zoom_to_selection():
+    """
+    Fits the map view to the points selected on the map.
+    Streamlit reports map selections but not zoom/pan events, so the selection is what drives the view.
+    """
+    map_state = st.session_state.get('main_map')
+    points = map_state['selection']['points'] if map_state else []
+    points = [point for point in points if 'lat' in point and 'lon' in point]
+    if not points:
+        return
+
+    view = fit_bounds([point['lat'] for point in points], [point['lon'] for point in points],
+                      MAP_VIEWPORT_PIXELS, margin=MAP_VIEW_MARGIN)
+    view['revision'] = st.session_state.get('map_view', {}).get('revision', 0) + 1
+    st.session_state.map_view = view
+
+
+def reset_map_view():
+    """
+    Resets the map view to the whole map.
+    """
+    st.session_state.map_view = {'revision': st.session_state.get('map_view', {}).get('revision', 0) + 1}
+
+
+def apply_map_view(fig):
+    """
+    Moves the map to the view kept in the session state.
+    The uirevision changes with the view, so that Plotly drops the user's pan/zoom only when the view is changed.
+    The map cannot be panned past the bounds of the view, outside of which no incident is sent.
+    :param fig: The map figure to update.
+    """
+    view = st.session_state.get('map_view', {})
+    config = MAP_CONFIGS["Continental USA"]
+    bounds = view_bounds()
+    fig.update_layout(
+        mapbox_center=view.get('center', config["center_coords"]),
+        mapbox_zoom=view.get('zoom', config["zoom_level"]),
+        mapbox_bounds={"west": bounds["lon"][0], "east": bounds["lon"][1],
+                       "south": bounds["lat"][0], "north": bounds["lat"][1]},
+        uirevision=f"view-{view.get('revision', 0)}",
+    )
+
+
+@st.cache_resource(max_entries=1)
+def get_spatial_index(_data, version):
+    """
+    Builds the spatial index of the incident coordinates, once per dataset version.
+    :param _data: (pd.DataFrame) The dataset (not hashed by Streamlit, the version identifies it).
+    :param version: (tuple) The dataset version.
+    :return: (dict) The spatial index, see map_layers.build_spatial_index.
+    """
+    return build_spatial_index(_data['Latitude'].to_numpy(), _data['Longitude'].to_numpy(), SPATIAL_INDEX_CELL_SIZE)
+
+
+def view_bounds():
+    """
+    Returns the bounds of the map view kept in the session state: the area shown by the map (with a margin),
+    within the bounding box of the map, which is also the default.
+    :return: (dict) The "lat" and "lon" [min, max] ranges of the view.
+    """
+    view = st.session_state.get('map_view', {})
+    box = MAP_CONFIGS['bounding_boxes']
+    return {
+        axis: [max(view[axis][0], box[axis][0]), min(view[axis][1], box[axis][1])] if axis in view else box[axis]
+        for axis in ("lat", "lon")
+    }
+
+
+def visible_rows(data):
+    """
+    Returns the rows inside the map view.
+    :param data: The dataset containing the map data.
+    :return: (np.ndarray) The sorted row numbers inside the view.
+    """
+    return query_viewport(get_spatial_index(data, st.session_state.data_version), view_bounds())
+
+
+def rows_to_mask(rows, size):
+    """
+    Converts row numbers to a boolean mask.
+    :param rows: (np.ndarray) The row numbers.
+    :param size: (int) The number of rows of the dataset.
+    :return: (np.ndarray) The boolean mask.
+    """
+    mask = np.zeros(size, dtype=bool)
+    mask[rows] = True
+    return mask
+
+
+def materialize(data, rows, variables):
+    """
+    Copies the given rows of the shared dataset, keeping only the columns of the given variables.
+    Selections are held as row numbers, so views never copy more than the columns they plot.
+    :param data: (pd.DataFrame) The dataset.
+    :param rows: (np.ndarray) The row numbers, or a boolean mask of the rows.
+    :param variables: (list) The variables of the view, see VARNAMES_TO_DATASET. Variables that are not
+                      columns of the dataset (e.g. the number of accidents) are skipped.
+    :return: (pd.DataFrame) The rows, indexed by their row ids.
+    """
+    columns = [VARNAMES_TO_DATASET.get(variable) for variable in variables]
+    columns = list(dict.fromkeys(column for column in columns if column in data.columns))
+    return data.iloc[rows, data.columns.get_indexer(columns)]
+
+
+def current_zoom():
+    """
+    Returns the zoom level of the map view kept in the session state.
+    Streamlit does not report the zoom of the rendered map, so the server-side view is used instead.
+    :return: (float) The zoom level.
+    """
+    view = st.session_state.get('map_view', {})
+    return view.get('zoom', MAP_CONFIGS["Continental USA"]["zoom_level"])
+
+
+def resolve_map_mode(point_count):
+    """
+    Resolves the map mode selected in the sidebar to the mode used to draw the map.
+    :param point_count: (int) The number of incidents that would be drawn as individual markers.
+    :return: (str) Either "Points", "Grid" or "Density".
+    """
+    mode = st.session_state.get('map_mode', "Auto")
+    if mode == "Auto":
+        if point_count <= MAP_POINT_BUDGET:
+            return "Points"
+        return "Grid" if point_count <= MAP_DENSITY_THRESHOLD else "Density"
+    return mode
+
+
+@st.cache_resource(max_entries=1)
+def get_hover_labels(_data, version):
+    """
+    Formats the date shown when hovering every incident, once per dataset version.
+    The coordinates are added by the browser from the trace data, through the hovertemplate.
+    :param _data: (pd.DataFrame) The dataset (not hashed by Streamlit, the version identifies it).
+    :param version: (tuple) The dataset version.
+    :return: (np.ndarray) The hover label of every row, in dataset order.
+    """
+    return _data['DATETIME'].dt.strftime('%Y-%m-%d %H:%M').to_numpy()
+
+
+# Hover templates filled in by the browser, so no per-point text is built on the server
+POINT_HOVERTEMPLATE = "%{text}<br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>"
+CELL_HOVERTEMPLATE = ("%{customdata[1]} incidents<br>Total damage: $%{customdata[2]:,.0f}"
+                      "<br>Injured: %{customdata[3]}<br>Killed: %{customdata[4]}<extra></extra>")
+
+
+def add_point_layer(fig, data, rows, marker, selected_marker, name, hover_labels):
+    """
+    Adds incidents to the map as individual markers.
+    The kind of every trace is recorded in the session state, so that map selections can be resolved.
+    :param fig: The map figure to update.
+    :param data: The dataset containing the map data.
+    :param rows: (np.ndarray) The row numbers of the incidents to add.
+    :param marker: The marker properties of the layer.
+    :param selected_marker: The marker properties of selected markers.
+    :param name: The name of the trace.
+    :param hover_labels: The precomputed hover label of every row of the dataset, see get_hover_labels.
+    """
+    fig.add_scattermapbox(
+        lat=compact_array(data["Latitude"].to_numpy()[rows], 'float32'),
+        lon=compact_array(data["Longitude"].to_numpy()[rows], 'float32'),
+        customdata=compact_array(rows, 'int32'),  # Row ids, used to resolve map selections
+        text=hover_labels[rows],
+        mode='markers',
+        marker=marker,
+        selected=dict(marker=selected_marker),
+        unselected=dict(marker=marker_properties_unselected()),
+        hovertemplate=POINT_HOVERTEMPLATE,
+        name=name,
+    )
+    st.session_state.map_layers.append({"kind": "points"})
+
+
+def add_cell_layer(fig, data, rows, marker, selected_marker, name, cell_size):
+    """
+    Adds incidents to the map as aggregated grid cells, each drawn as one marker sized by its incident count.
+    The kind of every trace is recorded in the session state, so that map selections can be resolved.
+    :param fig: The map figure to update.
+    :param data: The dataset containing the map data.
+    :param rows: (np.ndarray) The row numbers of the incidents to add.
+    :param marker: The marker properties of the layer.
+    :param selected_marker: The marker properties of selected cells.
+    :param name: The name of the trace.
+    :param cell_size: The size of the grid cells in degrees.
+    """
+    cells = aggregate_grid(
+        data["Latitude"].to_numpy()[rows],
+        data["Longitude"].to_numpy()[rows],
+        cell_size,
+        {column: data[column].to_numpy()[rows] for column in ["ACCDMG", "TOTINJ", "TOTKLD"]}
+    )
+    counts = cells["counts"]
+    sizes = compact_array(6 + 14 * np.sqrt(counts / counts.max()), 'float32') if len(counts) > 0 else []
+    fig.add_scattermapbox(
+        lat=compact_array(cells["lat"], 'float32'),
+        lon=compact_array(cells["lon"], 'float32'),
+        # Cell keys (used to resolve map selections) followed by the cell summary shown on hover
+        customdata=np.column_stack([
+            cells["keys"], counts, cells["sums"]["ACCDMG"], cells["sums"]["TOTINJ"], cells["sums"]["TOTKLD"]
+        ]),
+        mode='markers',
+        marker=dict(marker, size=sizes),
+        selected=dict(marker={key: value for key, value in selected_marker.items() if key != 'size'}),
+        unselected=dict(marker={key: value for key, value in marker_properties_unselected().items() if key != 'size'}),
+        hovertemplate=CELL_HOVERTEMPLATE,
+        name=name,
+    )
+    st.session_state.map_layers.append({"kind": "cells", "cell_size": cell_size})
+
+
+@st.cache_resource(max_entries=32)
+def get_density_grid(_lat, _lon, rows_key, bounds, cell_size):
+    """
+    Computes the kernel density of a set of incidents, shared by all sessions showing the same
+    incidents (i.e. the same filters and view) at the same zoom level.
+    :param _lat: (np.ndarray) The latitudes of the incidents (not hashed by Streamlit, rows_key identifies them).
+    :param _lon: (np.ndarray) The longitudes of the incidents.
+    :param rows_key: (tuple) The dataset version and a digest of the row numbers of the incidents.
+    :param bounds: (tuple) The (min, max) latitude and longitude ranges covered by the grid.
+    :param cell_size: (float) The cell size of the density grid in degrees.
+    :return: (dict) The density grid, see map_layers.kernel_density.
+    """
+    return kernel_density(_lat, _lon, {"lat": bounds[0], "lon": bounds[1]}, cell_size, DENSITY_BANDWIDTH)
+
+
+def add_density_layer(fig, data, rows, name):
+    """
+    Adds incidents to the map as one density heatmap trace, computed on the server over the map view.
+    :param fig: The map figure to update.
+    :param data: The dataset containing the map data.
+    :param rows: (np.ndarray) The row numbers of the incidents to add.
+    :param name: The name of the trace.
+    """
+    bounds = view_bounds()
+    # The grid never gets finer than 500 cells along the longest side of the view
+    extent = max(bounds["lat"][1] - bounds["lat"][0], bounds["lon"][1] - bounds["lon"][0])
+    cell_size = max(grid_cell_size(current_zoom(), DENSITY_CELL_PIXELS), extent / 500)
+    rows_key = (st.session_state.data_version, hashlib.sha1(rows.tobytes()).hexdigest())
+    density = get_density_grid(
+        data["Latitude"].to_numpy()[rows],
+        data["Longitude"].to_numpy()[rows],
+        rows_key,
+        (tuple(bounds["lat"]), tuple(bounds["lon"])),
+        cell_size,
+    )
+    fig.add_densitymapbox(
+        lat=compact_array(density["lat"], 'float32'),
+        lon=compact_array(density["lon"], 'float32'),
+        z=compact_array(density["density"], 'float32'),
+        radius=DENSITY_CELL_PIXELS,
+        colorscale='YlOrRd',
+        zmin=0,
+        zmax=1,
+        showscale=False,
+        hoverinfo='skip',
+        name=name,
+    )
+    st.session_state.map_layers.append({"kind": "density"})
+
+
+def filter_marker_properties(in_filter):
+    """
+    Returns marker properties styling every marker of the base trace as selected or unselected.
+    :param in_filter: (np.ndarray) Boolean array telling, for every marker, whether it passes the filters.
+    """
+    selected = marker_properties_selected()
+    unselected = marker_properties_unselected()
+    return dict(
+        size=selected["size"],
+        color=in_filter.astype(np.int8),
+        colorscale=[[0, unselected["color"]], [1, selected["color"]]],
+        cmin=0,
+        cmax=1,
+        opacity=compact_array(np.where(in_filter, selected["opacity"], unselected["opacity"]), 'float32'),
+    )
+
+
+def update_figure_data(fig, data, selected_filter):
     """
     Updates the map figure with data for selected and unselected markers.
+    In "Points" mode, the incidents in view form one base trace that is only rebuilt when the view
+    changes; filter changes only restyle its markers, and the figure is left untouched when nothing changed.
+    In "Density" mode, only the incidents passing the filters are drawn, as a density heatmap.
     :param fig: The map figure to update.
     :param data: The dataset containing the map data.
     :param selected_filter: Filter applied to the dataset.
-    :param selected_markers: Data for markers manually selected on the map.
-    """
-    # Separate selected and unselected data
-    global selected_data
-    global unselected_data
-    selected_data = data[selected_filter].copy()
-    unselected_data = data[~selected_filter].copy()
-    selected_markers = st.session_state.callback_data.get('selected_markers', [])
-      
-    # Remove existing traces
-    fig.data = []
-    if len(selected_markers) > 0:
-        selected_data_copy = st.session_state.callback_data.get('selected_data_back', [])
-        unselected_data_copy = st.session_state.callback_data.get('unselected_data_back', [])
-        selected_data_copy = selected_data_copy[selected_filter]
-        unselected_data_copy = pd.concat([pd.DataFrame(unselected_data_copy), data[~selected_filter]], ignore_index=True)
-        # Add the unselected trace first
-        fig.add_scattermapbox(
-            lat=unselected_data_copy["Latitude"].tolist(),
-            lon=unselected_data_copy["Longitude"].tolist(),
-            hovertext=(
-                unselected_data_copy["DATETIME"].dt.strftime('%Y-%m-%d %H:%M') + 
-                "<br>Lat: " + unselected_data_copy["Latitude"].astype(str) + 
-                "<br>Lon: " + unselected_data_copy["Longitude"].astype(str)
-            ).tolist(),
-            mode='markers',
-            marker=marker_properties_unselected(),
-            selected=dict(marker=marker_properties_unselected()),
-            unselected=dict(marker=marker_properties_unselected()),
-            hovertemplate="%{hovertext}<extra></extra>",
-            name="Unselected",
-        )
-        
-        # Add the selected trace second
-        fig.add_scattermapbox(
-            lat=selected_data_copy["Latitude"].tolist(),
-            lon=selected_data_copy["Longitude"].tolist(),
-            hovertext=(
-                selected_data_copy["DATETIME"].dt.strftime('%Y-%m-%d %H:%M') + 
-                "<br>Lat: " + selected_data_copy["Latitude"].astype(str) + 
-                "<br>Lon: " + selected_data_copy["Longitude"].astype(str)
-            ).tolist(),
-            mode='markers',
-            marker=marker_properties_selected(),
-            selected=dict(marker=marker_properties_selected()),
-            unselected=dict(marker=marker_properties_unselected()),
-            hovertemplate="%{hovertext}<extra></extra>",
-            name="Selected",
-        )
-        
-        # Add scattermapbox for selected markers
-        print("selected markers.....")
-        selected_markers['DATETIME'] = pd.to_datetime(selected_markers['DATETIME'], errors='coerce')
-        fig.add_scattermapbox(
-            lat=selected_markers["Latitude"].tolist(),
-            lon=selected_markers["Longitude"].tolist(),
-            mode='markers',
-            marker=dict(size=6, opacity=1, color='rgb(255, 255, 0)'),  # Brighter yellow
-            selected=dict(marker=marker_properties_unselected()),
-            unselected=dict(marker=marker_properties_unselected()),
-            hovertext=(
-                selected_markers["DATETIME"].dt.strftime('%Y-%m-%d %H:%M') + 
-                "<br>Lat: " + selected_markers["Longitude"].astype(str) + 
-                "<br>Lon: " + selected_markers["Longitude"].astype(str)
-            ).tolist(),
-            hovertemplate="%{hovertext}<extra></extra>",
-
-            name="Unselected",
-        )
-        
+    """
+    # Incidents drawn as selected: those passing the filters, restricted to the map selection while the
+    # Explore chart is brushed. The incidents passing every linked view are highlighted
+    crossfilter = get_crossfilter()
+    if is_filtered(crossfilter, "explore"):
+        in_filter = passing_mask(crossfilter, exclude=["explore"])
+        highlighted = passing_rows(crossfilter)
     else:
-        st.session_state.callback_data['selected_data_back'] = []
-        st.session_state.callback_data['unselected_data_back'] = []
-        # Add the unselected trace first
-        fig.add_scattermapbox(
-            lat=unselected_data["Latitude"].tolist(),
-            lon=unselected_data["Longitude"].tolist(),
-            hovertext=(
-                unselected_data["DATETIME"].dt.strftime('%Y-%m-%d %H:%M') + 
-                "<br>Lat: " + unselected_data["Latitude"].astype(str) + 
-                "<br>Lon: " + unselected_data["Longitude"].astype(str)
-            ).tolist(),
-            mode='markers',
-            marker=marker_properties_unselected(),
-            selected=dict(marker=marker_properties_unselected()),
-            unselected=dict(marker=marker_properties_unselected()),
-            hovertemplate="%{hovertext}<extra></extra>",
-            name="Unselected",
-        )
+        in_filter = selected_filter.to_numpy()
+        highlighted = np.empty(0, dtype=np.int64)
+
+    # Only the incidents inside the map view are drawn, as individual markers (at most MAP_POINT_BUDGET
+    # of them, downsampled if needed), as aggregated cells or as a density heatmap, depending on how many there are
+    visible = visible_rows(data)
+    mode = resolve_map_mode(len(visible))
+    highlighted = highlighted[rows_to_mask(visible, len(data))[highlighted]]
+    hover_labels = get_hover_labels(data, st.session_state.data_version)
+    trace_state = st.session_state.setdefault('map_trace_state', {})
+
+    if mode == "Grid":
+        cell_size = grid_cell_size(current_zoom(), GRID_CELL_PIXELS)
+        trace_state.clear()
+        st.session_state.map_layers = []
+        fig.data = []
+        add_cell_layer(fig, data, visible[~in_filter[visible]], marker_properties_unselected(),
+                       marker_properties_unselected(), "Unselected", cell_size)
+        add_cell_layer(fig, data, visible[in_filter[visible]], marker_properties_selected(),
+                       marker_properties_selected(), "Selected", cell_size)
+        if len(highlighted) > 0:
+            add_cell_layer(fig, data, highlighted, marker_properties_highlighted(),
+                           marker_properties_unselected(), "Highlighted", cell_size)
+    elif mode == "Density":
+        trace_state.clear()
+        st.session_state.map_layers = []
+        fig.data = []
+        add_density_layer(fig, data, visible[in_filter[visible]], "Density")
+        if len(highlighted) > 0:
+            add_point_layer(fig, data, highlighted, marker_properties_highlighted(),
+                            marker_properties_unselected(), "Highlighted", hover_labels)
+    else:
+        # The base trace holds the coordinates of the incidents in view and only depends on the view
+        base_key = (st.session_state.data_version, repr(st.session_state.get('map_view', {})))
+        if trace_state.get('base_key') != base_key or len(fig.data) == 0:
+            rows = downsample(visible, MAP_POINT_BUDGET)
+            st.session_state.map_layers = []
+            fig.data = []
+            add_point_layer(fig, data, rows, marker_properties_selected(),
+                            {"opacity": marker_properties_selected()["opacity"]}, "Incidents", hover_labels)
+            trace_state.clear()
+            trace_state.update(base_key=base_key, rows=rows)
+
+        # Filter changes only restyle the base markers
+        in_filter = in_filter[trace_state['rows']]
+        if not np.array_equal(in_filter, trace_state.get('in_filter')):
+            fig.data[0].marker = filter_marker_properties(in_filter)
+            trace_state['in_filter'] = in_filter
+
+        # Markers highlighted from the Explore chart are drawn on top, in a trace of their own
+        highlighted_key = highlighted.tobytes()
+        if trace_state.get('highlighted') != highlighted_key:
+            fig.data = fig.data[:1]
+            st.session_state.map_layers = st.session_state.map_layers[:1]
+            if len(highlighted) > 0:
+                add_point_layer(fig, data, highlighted, marker_properties_highlighted(),
+                                marker_properties_unselected(), "Highlighted", hover_labels)
+            trace_state['highlighted'] = highlighted_key
+
+    apply_map_view(fig)
+
 
-        # Add the selected trace second
-        fig.add_scattermapbox(
-            lat=selected_data["Latitude"].tolist(),
-            lon=selected_data["Longitude"].tolist(),
-            hovertext=(
-                selected_data["DATETIME"].dt.strftime('%Y-%m-%d %H:%M') + 
-                "<br>Lat: " + selected_data["Latitude"].astype(str) + 
-                "<br>Lon: " + selected_data["Longitude"].astype(str)
-            ).tolist(),
-            mode='markers',
-            marker=marker_properties_selected(),
-            selected=dict(marker=marker_properties_selected()),
-            unselected=dict(marker=marker_properties_unselected()),
-            hovertemplate="%{hovertext}<extra></extra>",
-            name="Selected",
-        )
-    
-    
 def check_single_event():
     """
     Checks if a single event is selected and displays detailed information if true.
     :return: Boolean indicating whether a single event is selected.
     """
 
-    global selected_data
-    
+    selected_rows = st.session_state.get('map_selection', [])
+
     # Check if only one event is selected
-    if len(selected_data) == 1:
+    if len(selected_rows) == 1:
         padding_left, content, padding_right = st.columns([0.05, 1, 0.05], gap="small")
         with content:
             st.write("")
@@ -247,7 +609,7 @@ def check_single_event():
             st.subheader("Meta-Information for Selected Accident")
             
             # Extract the single row of data
-            accident_data = selected_data.iloc[0]
+            accident_data = st.session_state.map_data.iloc[selected_rows[0]]
             
             # Location Information
             with col1:
@@ -291,168 +653,279 @@ def check_single_event():
             
             # Display Narration
             st.subheader("Accident Description")
-            st.write(f"{accident_data['NARR']}")
+            st.write(read_narrative(accident_data.name))
             st.write("")
         return True
     
     return False
 
 
+@st.cache_resource(max_entries=16)
+def get_row_groups(_data, version, column):
+    """
+    Groups the rows of a column by value, once per dataset version and column.
+    :param _data: (pd.DataFrame) The dataset (not hashed by Streamlit, the version identifies it).
+    :param version: (tuple) The dataset version.
+    :param column: (str) The column.
+    :return: (dict) The row groups, see filter_engine.build_row_groups.
+    """
+    return build_row_groups(_data[column])
+
+
 def bar_callback():
     """
     Callback function triggered when a bar chart selection is made.
-    Extracts selected points, identifies corresponding data, and updates session state with selected/unselected markers.
+    Brushes the "explore" dimension with the selected bars (or points), which updates the linked views
+    incrementally. No data is copied.
     """
     if st.session_state.bottom_panel:
         # Access the selected points from the bar chart
         selected_points = st.session_state.bottom_panel['selection']['points']
-        
+        crossfilter = get_crossfilter()
+        if "explore" not in crossfilter["dimensions"]:
+            return
+
         # Check if selected_points is empty
         if not selected_points:
-            print("No points selected.")
+            logger.debug("No points selected.")
+            filter_all(crossfilter, "explore")
+            st.session_state.explore_brush_changed = True
             return  # Exit the function if no points are selected
 
-        x_values = [item['x'] for item in selected_points]
-        print(f"Selected x_values: {x_values}")
-
-        # Extract x_var and y_var from customdata
-        x_var, y_var = selected_points[0]['customdata']
-        print(f"x_var: {x_var}, y_var: {y_var}")
-
-        # Get the corresponding column name
+        # The plotted variables are recorded in the session state when the chart is drawn
+        view = st.session_state.get('explore_view', {})
+        x_var, y_var = view.get('x_var'), view.get('y_var')
         x_var_col = VARNAMES_TO_DATASET[x_var]
-        print(f"x_var_col: {x_var_col}")
-
-        # Ensure selected_data exists and is valid
-        global selected_data
-        global unselected_data
-        data = selected_data.copy()
-        data_unselected = unselected_data.copy()
-        if data is None or data.empty:
-            print("selected_data is empty or None. Using st.session_state.map_data instead.")
-            data = st.session_state.map_data
-
-        print(f"Data for {x_var_col}:")
-        print(data[x_var_col])
-
-        # Convert x_values based on the column type
-        if x_var_col == 'TYPE':
-            # Map the description values in x_values to their corresponding keys and convert to float
-            x_values = [float(key) for value in x_values if (key := next((k for k, v in TYPE_DESCRIPTIONS.items() if v == value), None))]
-            print(f"Converted x_values to float keys for TYPE: {x_values}")
-        
-        elif x_var_col == 'VISIBLTY':
-            # Map the description values in x_values to their corresponding keys for VIS
-            x_values = [float(key) for value in x_values if (key := next((k for k, v in VIS_DESCRIPTIONS.items() if v == value), None))]
-            print(f"Converted x_values to float keys for VIS: {x_values}")
-        
-        elif x_var_col == 'WEATHER':
-            # Map the description values in x_values to their corresponding keys for WEATHER
-            x_values = [float(key) for value in x_values if (key := next((k for k, v in WEATHER_DESCRIPTIONS.items() if v == value), None))]
-            print(f"Converted x_values to float keys for WEATHER: {x_values}")
-        
-        elif x_var_col == 'TYPTRK':
-            # Map the description values in x_values to their corresponding keys for TRACK
-            x_values = [float(key) for value in x_values if (key := next((k for k, v in TRACK_DESCRIPTIONS.items() if v == value), None))]
-            print(f"Converted x_values to float keys for TRACK: {x_values}")
-        
-        else:
-            print("No conversion to keys for x_values as x_var_col is not 'TYPE', 'VIS', 'WEATHER', or 'TRACK'.")
-
-        if data is not None and not data.empty:
-            # Properly filter the DataFrame for all x_values
-            x_data = data[data[x_var_col].isin(x_values)]
-
-            # Extract Latitude, Longitude, and DATETIME
-            print(data[x_var_col])
-            if {'Latitude', 'Longitude', 'DATETIME'}.issubset(data.columns):
-                df = x_data[['Latitude', 'Longitude', 'DATETIME', x_var_col]]
-                print("Extracted DataFrame:")
-                print(df)
-            else:
-                print("Required columns (Latitude, Longitude, DATETIME) are not in the data.")
+        logger.debug("x_var: %s, y_var: %s, x_var_col: %s", x_var, y_var, x_var_col)
+
+        # Bars carry the code of their group, other charts only report the plotted x values,
+        # which are descriptions for categorical columns
+        group_keys = [item.get('customdata') for item in selected_points]
+        if all(group_key is not None for group_key in group_keys):
+            x_values = [np.ravel(group_key)[0] for group_key in group_keys]
+        elif x_var_col in DESCRIPTION_CODES:
+            codes = DESCRIPTION_CODES[x_var_col]
+            x_values = [codes[item['x']] for item in selected_points if item['x'] in codes]
         else:
-            print("No data available after fallback to st.session_state.map_data.")
+            x_values = [item['x'] for item in selected_points]
 
-        if len(df) > 0:
-            st.session_state.callback_data = {
-                    'selected_markers': df,
-                    'selected_data_back': data,
-                    'unselected_data_back': data_unselected,
-                    'selected_variable_back': x_var,
-                    'second_selected_var_back': y_var
-                }
-        
-        # print(f"x_values type: {type(x_values[0])}")
-        # print(f"TYPE column dtype: {data[x_var_col].dtype}")
+        try:
+            x_values = [float(value) for value in x_values]
+        except (TypeError, ValueError):
+            logger.debug("Selections on %s cannot be resolved to incidents.", x_var_col)
+            return
+        logger.debug("Selected values: %s", x_values)
+
+        if filter_values(crossfilter, "explore", x_values) == 0:
+            logger.debug("The selection does not match any incident.")
+            filter_all(crossfilter, "explore")
+        # The linked views are redrawn by rerunning the whole page, see app.explore_section
+        st.session_state.explore_brush_changed = True
+
+
+def register_explore_dimension(plot_func, selected_variable, second_selected_var):
+    """
+    Registers the "explore" dimension of the linked-selection engine on the x variable of the Explore chart,
+    with the y variable as measure for bar charts of means. Changing the chart replaces the dimension,
+    which clears its brush.
+    :param plot_func: The plot function of the chart.
+    :param selected_variable: The primary variable for the plot.
+    :param second_selected_var: The secondary variable for the plot.
+    :return: (dict) The engine.
+    """
+    crossfilter = get_crossfilter()
+    x_column = VARNAMES_TO_DATASET[selected_variable]
+    measure = VARNAMES_TO_DATASET[second_selected_var] if plot_func is plot_bar_chart else None
+    measure = None if measure == "🔢 Number of Accidents" else measure
+    if st.session_state.get('explore_dimension') != (x_column, measure):
+        data = st.session_state.map_data
+        if is_filtered(crossfilter, "explore"):
+            st.session_state.explore_brush_changed = True
+        remove_dimension(crossfilter, "explore")
+        add_dimension(
+            crossfilter, "explore",
+            get_row_groups(data, st.session_state.data_version, x_column),
+            {measure: data[measure].to_numpy(dtype='float64', na_value=np.nan)} if measure is not None else None
+        )
+        st.session_state.explore_dimension = (x_column, measure)
+    return crossfilter
+
+
+def linked_grouped_data(plot_func, crossfilter):
+    """
+    Reads the per-group aggregates of a bar chart from the "explore" dimension, whose group counts and sums
+    are kept up to date by the linked-selection engine.
+    :param plot_func: The plot function of the chart.
+    :param crossfilter: (dict) The engine, with the "explore" dimension registered for the chart.
+    :return: (pd.DataFrame) The grouped data, or None for other charts.
+    """
+    if plot_func is not plot_bar_chart:
+        return None
+    x_column, measure = st.session_state.explore_dimension
+    values, counts = group_counts(crossfilter, "explore")
+    grouped = pd.DataFrame({x_column: values, 'Counts': counts})
+    if measure is None:
+        return grouped[grouped['Counts'] > 0]
+    grouped[measure] = group_means(crossfilter, "explore", measure)[1]
+    return grouped.loc[grouped['Counts'] > 0, [x_column, measure]]
+
+
+@st.cache_resource(max_entries=1)
+def get_cube(_data, version):
+    """
+    Builds the pre-aggregated cube of the dataset, once per dataset version.
+    :param _data: (pd.DataFrame) The dataset (not hashed by Streamlit, the version identifies it).
+    :param version: (tuple) The dataset version.
+    :return: (dict) The cube, see cube.build_cube.
+    """
+    return build_cube(_data)
+
+
+def cube_grouped_data(plot_func, selected_filter, selected_variable, second_selected_var):
+    """
+    Rolls the incidents passing the filters up from the cube, for the Explore charts that only show
+    per-group aggregates (bar charts and the year-month heatmap).
+    :param plot_func: The plot function of the chart.
+    :param selected_filter: The filters that the user selected.
+    :param selected_variable: The primary variable for the plot.
+    :param second_selected_var: The secondary variable for the plot.
+    :return: (pd.DataFrame) The grouped data, or None if the chart or the filters cannot be answered by the cube.
+    """
+    if plot_func is plot_bar_chart:
+        dimensions = [VARNAMES_TO_DATASET[selected_variable]]
+        measure = VARNAMES_TO_DATASET[second_selected_var]
+        measure = None if measure == "🔢 Number of Accidents" else measure
+    elif plot_func is plot_year_month_heatmap:
+        dimensions = ['YM']
+        measure = None
+    else:
+        return None
+    if any(dimension not in CUBE_DIMENSIONS + ['YM'] for dimension in dimensions) or measure not in CUBE_MEASURES + [None]:
+        return None
+
+    data = st.session_state.map_data
+    version = st.session_state.data_version
+    grouped = filtered_rollup(
+        get_cube(data, version), get_filter_index(data, version), st.session_state.filter_spec, data,
+        selected_filter.to_numpy(), row_keys(st.session_state.time_buckets, 'month'), dimensions, measure
+    )
+    if grouped is None:
+        logger.debug("Filters cannot be answered by the cube, grouping the filtered incidents instead.")
+    return grouped
+
+
+def time_bucket_grouped_data(plot_func, rows):
+    """
+    Counts incidents per year-month from the precomputed time buckets, for the year-month heatmap.
+    :param plot_func: The plot function of the chart.
+    :param rows: (np.ndarray) The row numbers of the incidents to count.
+    :return: (pd.DataFrame) The counts ('Counts') per year-month key ('YM'), or None for other charts.
+    """
+    if plot_func is not plot_year_month_heatmap:
+        return None
+    keys, counts = bucket_counts(st.session_state.time_buckets, 'month', rows)
+    return pd.DataFrame({'YM': keys, 'Counts': counts})
+
+
+def explore_figure(plot_func, data, selected_variable, second_selected_var, grouped=None):
+    """
+    Creates an Explore chart from the incidents or, when given, from their grouped aggregates.
+    :param plot_func: The plot function of the chart.
+    :param data: (callable) Returns the incidents to plot; only called if grouped is None.
+    :param selected_variable: The primary variable for the plot.
+    :param second_selected_var: The secondary variable for the plot.
+    :param grouped: (pd.DataFrame) The grouped aggregates, see cube_grouped_data and time_bucket_grouped_data.
+    :return: The Plotly figure.
+    """
+    if grouped is not None:
+        return plot_func(None, selected_variable, second_selected_var,
+                         catalog=st.session_state.data_catalog, grouped=grouped)
+    return plot_func(data(), selected_variable, second_selected_var, catalog=st.session_state.data_catalog)
+
+
+def filtered_explore_figure(plot_func, selected_filter, selected_variable, second_selected_var):
+    """
+    Creates the Explore chart of all incidents passing the filters, from the cube or the time buckets when possible.
+    :param plot_func: The plot function of the chart.
+    :param selected_filter: The filters that the user selected.
+    :param selected_variable: The primary variable for the plot.
+    :param second_selected_var: The secondary variable for the plot.
+    :return: The Plotly figure.
+    """
+    grouped = cube_grouped_data(plot_func, selected_filter, selected_variable, second_selected_var)
+    if grouped is None:
+        grouped = time_bucket_grouped_data(plot_func, np.flatnonzero(selected_filter.to_numpy()))
+    return explore_figure(plot_func,
+                          lambda: materialize(st.session_state.map_data, selected_filter.to_numpy(),
+                                              [selected_variable, second_selected_var]),
+                          selected_variable, second_selected_var, grouped)
 
 
 def simple_graph(key, selected_filter, selected_variable, second_selected_var):   # ex update_bottom_panel
     """
     Generates a graph based on the selected variable and secondary variable.
+    The chart shows the incidents passing the filters of the other linked views.
     :param key: The tuple identifying the plot function.
     :param selected_filter: The filters that the user selected.
     :param selected_variable: The primary variable for the plot.
     :param second_selected_var: The secondary variable for the plot.
     """
-    st.session_state.callback_data['selected_markers'] = []
     if key in PLOT_FUNCTIONS:
-        global selected_data
-        global unselected_data
-        selected_data_copy = st.session_state.callback_data.get('selected_data_back', [])
-        unselected_data_copy = st.session_state.callback_data.get('unselected_data_back', [])
-        
-        # Check if selected_variable_back and selected_variable are different
-        selected_variable_back = st.session_state.callback_data.get('selected_variable_back', None)
-        second_selected_var_back = st.session_state.callback_data.get('second_selected_var_back', None)
-        
-        if selected_variable_back != selected_variable or second_selected_var_back != second_selected_var:
-            st.session_state.callback_data['selected_data_back'] = []
-            st.session_state.callback_data['unselected_data_back'] = []
-
         plot_func = PLOT_FUNCTIONS[key]
-        
-        fig = None
-        
-        # Check if selected_data_back is available, otherwise use selected_data, and then map_data
-        if len(selected_data_copy) > 0:
-            selected_data = selected_data_copy
-            unselected_data = unselected_data_copy        
-        
-        if selected_data is not None and not selected_data.empty:
-            data_to_use = selected_data[selected_filter]
+
+        # Identifies the chart for bar_callback, instead of attaching it to every plotted point
+        st.session_state.explore_view = {'x_var': selected_variable, 'y_var': second_selected_var}
+        crossfilter = register_explore_dimension(plot_func, selected_variable, second_selected_var)
+
+        # Figures of the whole filtered dataset only depend on the filters, so they are shared by all
+        # sessions through the result cache. With a map selection, bar charts read their group counts
+        # from the linked-selection engine
+        if is_filtered(crossfilter, "map"):
+            rows = passing_rows(crossfilter, exclude=["explore"])
+            grouped = linked_grouped_data(plot_func, crossfilter)
+            if grouped is None:
+                grouped = time_bucket_grouped_data(plot_func, rows)
+            fig = explore_figure(plot_func,
+                                 lambda: materialize(st.session_state.map_data, rows, [selected_variable, second_selected_var]),
+                                 selected_variable, second_selected_var, grouped)
         else:
-            data_to_use = st.session_state.map_data[selected_filter]
-        
-        # Use the selected data (or map_data) for plotting
-        fig = plot_func(data_to_use, selected_variable, second_selected_var)
+            fig = cached_result(
+                get_result_cache(),
+                ("explore", st.session_state.filter_key, key),
+                lambda: filtered_explore_figure(plot_func, selected_filter, selected_variable, second_selected_var)
+            )
+        if REPORT_FIGURE_PAYLOAD:
+            log_payload("Explore", fig)
         st.plotly_chart(fig, on_select=bar_callback, key="bottom_panel", use_container_width=True)        
     else:
         st.write("No predefined plot available for this selection.")
 
 
-def parallel_coord_plot(selected_filter, par_plot_vars, binning):
+def parallel_coord_plot(selected_filter, par_plot_vars, binning, aggregate=False):
     """
     Generates and displays a parallel coordinates plot based on selected variables.
+    The plot shows the incidents passing the filters of every linked view.
     :param selected_filter: The filters that the user selected.
     :param par_plot_vars: List of variables to include in the parallel coordinates plot.
     :param binning: Boolean flag to enable or disable binning for continuous variables.
+    :param aggregate: Boolean flag to draw one weighted line per distinct combination of values.
     """
-    global selected_data
-    global unselected_data
-    selected_data_copy = st.session_state.callback_data.get('selected_data_back', [])
-    unselected_data_copy = st.session_state.callback_data.get('unselected_data_back', [])
-
-    # Check if selected_data_back is available, otherwise use selected_data, and then map_data
-    if len(selected_data_copy) > 0:
-        selected_data = selected_data_copy
-        unselected_data = unselected_data_copy        
-    
-    if selected_data is not None and not selected_data.empty:
-        data_to_use = selected_data[selected_filter]
+    bins = get_bins(st.session_state.map_data, st.session_state.data_version)
+    crossfilter = get_crossfilter()
+
+    # Figures of the whole filtered dataset only depend on the filters, so they are shared by all sessions
+    if is_filtered(crossfilter, "map") or is_filtered(crossfilter, "explore"):
+        parallel_fig = parallel_plot(materialize(st.session_state.map_data, passing_rows(crossfilter), par_plot_vars),
+                                     par_plot_vars, binning,
+                                     catalog=st.session_state.data_catalog, bins=bins, aggregate=aggregate)
     else:
-        data_to_use = st.session_state.map_data[selected_filter]
-        
-    parallel_fig = parallel_plot(data_to_use, par_plot_vars, binning)
+        parallel_fig = cached_result(
+            get_result_cache(),
+            ("combine", st.session_state.filter_key, tuple(par_plot_vars), binning, aggregate),
+            lambda: parallel_plot(materialize(st.session_state.map_data, selected_filter.to_numpy(), par_plot_vars),
+                                  par_plot_vars, binning,
+                                  catalog=st.session_state.data_catalog, bins=bins, aggregate=aggregate)
+        )
+    if REPORT_FIGURE_PAYLOAD:
+        log_payload("Combine", parallel_fig)
     st.plotly_chart(parallel_fig, use_container_width=True)
- 
\ No newline at end of file
@@ -0,0 +1,21 @@
+import numpy as np
+
+# The format of the narrative store, shared by the app (narratives.py) and the offline cleaning script
+# (clean_dataset.py). Only depends on numpy, so the script can write the store without the app installed.
+
+
+def write_narratives(narratives, text_path, offsets_path):
+    """
+    Writes the narratives to an offset-indexed store: one file with all UTF-8 encoded texts
+    back to back, and one array where entries i and i + 1 delimit the text of row i.
+    :param narratives: (pd.Series) The narrative of every row, in dataset order.
+    :param text_path: (str) The path of the file holding the texts.
+    :param offsets_path: (str) The path of the .npy file holding the offsets.
+    """
+    encoded = [text.encode('utf-8') for text in narratives.fillna('').astype(str)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+
+    with open(text_path, 'wb') as file:
+        file.write(b''.join(encoded))
+    np.save(offsets_path, offsets)
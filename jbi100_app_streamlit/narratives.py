@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from config import DATA_PATH, NARRATIVES_PATH, NARRATIVE_OFFSETS_PATH
+from narrative_store import write_narratives
+
+
+def ensure_narrative_store():
+    """
+    Makes sure the narrative store is at least as recent as the CSV dataset.
+    clean_dataset.py writes the store; if it is missing or outdated, it is rebuilt here from the NARR column.
+    """
+    paths = [NARRATIVES_PATH, NARRATIVE_OFFSETS_PATH]
+    if not os.path.exists(DATA_PATH) or all(os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(DATA_PATH) for path in paths):
+        return
+
+    print("Narrative store is missing or outdated, rebuilding it from the CSV dataset.")
+    narratives = pd.read_csv(DATA_PATH, usecols=['NARR'], low_memory=False)['NARR']
+    write_narratives(narratives, NARRATIVES_PATH, NARRATIVE_OFFSETS_PATH)
+
+
+@st.cache_resource(max_entries=1)
+def load_offsets(path, version):
+    """
+    Memory-maps the narrative offsets, shared by all sessions.
+    :param path: (str) The path of the .npy file holding the offsets.
+    :param version: (int) The modification time of the file, used as part of the cache key.
+    :return: (np.ndarray) The read-only offsets.
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def read_narrative(row_id):
+    """
+    Reads the narrative of a single incident from the store.
+    :param row_id: (int) The row of the incident in the dataset.
+    :return: (str) The narrative, or an empty string if the incident is not in the store.
+    """
+    offsets = load_offsets(NARRATIVE_OFFSETS_PATH, os.stat(NARRATIVE_OFFSETS_PATH).st_mtime_ns)
+    if not 0 <= row_id < len(offsets) - 1:
+        return ""
+
+    start, end = int(offsets[row_id]), int(offsets[row_id + 1])
+    with open(NARRATIVES_PATH, 'rb') as file:
+        file.seek(start)
+        return file.read(end - start).decode('utf-8')
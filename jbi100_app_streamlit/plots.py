@@ -1,8 +1,10 @@
 import streamlit as st
 import plotly.express as px
 from constants import VARNAMES_TO_DATASET, WEATHER_DESCRIPTIONS, VIS_DESCRIPTIONS, TYPE_DESCRIPTIONS
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from catalog import column_bounds
 
 
 def plot_bar_graph(data):
@@ -52,63 +54,85 @@ def plot_timeseries(data):
     st.plotly_chart(fig, use_container_width=True)
 
 
-def make_bins(var, data, dims, labs, binning):
+# Continuous variables of the parallel coordinates plot that can be binned: bin name, unit and
+# whether the variable is non-negative
+BINNED_VARIABLES = {
+    "🌡️ Temperature": ("temperature_bin", "°F", False),
+    "🚄 Speed": ("speed_bin", "mph", True),
+    "💸 Total Damage Costs": ("costs_bin", "$", True),
+    "🪨 Weight": ("weight_bin", "tons", True),
+}
+
+
+def compute_bins(values, non_negative):
+    """
+    Splits a continuous variable into 10 equal-width bins.
+    :param values: (pd.Series) The values of the variable.
+    :param non_negative: (bool) Whether the variable is non-negative, in which case the first bin is labeled from 0.
+    :return: (dict) The bin "codes" of the values (-1 where missing), the bin "edges" and the "ticktext" of every bin.
+    """
+    binned, edges = pd.cut(values, bins=10, precision=1, duplicates="drop", retbins=True)
+    ticktext = [str(interval) for interval in binned.cat.categories]
+
+    # Adjust tick labels for non-negative variables to remove negative ranges
+    if non_negative:
+        tokens = ticktext[0].split(",")
+        tokens[0] = "(0.0"
+        ticktext[0] = ",".join(tokens)
+
+    return {
+        "codes": binned.cat.codes.to_numpy().astype(np.int8),
+        "edges": edges,
+        "ticktext": ticktext,
+    }
+
+
+@st.cache_resource(max_entries=1)
+def get_bins(_data, version):
+    """
+    Bins the continuous variables of the parallel coordinates plot over the whole dataset, once per
+    dataset version, so that bin edges do not move when the filters change.
+    :param _data: (pd.DataFrame) The dataset (not hashed by Streamlit, the version identifies it).
+    :param version: (tuple) The dataset version.
+    :return: (dict) The bins of every binned column, see compute_bins.
+    """
+    return {
+        VARNAMES_TO_DATASET[var]: compute_bins(_data[VARNAMES_TO_DATASET[var]], non_negative)
+        for var, (_, _, non_negative) in BINNED_VARIABLES.items()
+    }
+
+
+def make_bins(var, data, dims, labs, binning, bins=None):
     """
     Creates bins for a specified variable and updates the dimensions for a parallel plot.
+    The data is left untouched: the bin codes are looked up in the precomputed bins by row id.
     :param var: (str) The name of the variable to be binned.
     :param data: (pd.DataFrame) The dataset containing the variable.
     :param dims: (list) The list of dimensions to update for the parallel plot.
     :param labs: (dict) A dictionary to store labels for the parallel plot.
     :param binning: (bool) A flag indicating whether to apply binning or use raw values.
-    :return: The name of the numeric column created for the binned variable or None if no numeric column was created.
+    :param bins: (dict) The bins of the whole dataset, see get_bins; if None, the data is binned on its own.
+    :return: The name of the numeric column of the binned variable or None if the variable is not binned.
     """
-    if var in ["🌡️ Temperature", "🚄 Speed", "💸 Total Damage Costs", "🪨 Weight"]:
-        # Define bin names and units
-        non_negative = False
-        if var == "🌡️ Temperature":
-            name = "temperature_bin"
-            unit = "°F"
-        elif var == "🚄 Speed":
-            name = "speed_bin"
-            unit = "mph"
-            non_negative = True
-        elif var == "💸 Total Damage Costs":
-            name = "costs_bin"
-            unit = "$"
-            non_negative = True
-        elif var == "🪨 Weight":
-            name = "weight_bin"
-            unit = "tons"
-            non_negative = True
-
+    if var in BINNED_VARIABLES:
+        name, unit, non_negative = BINNED_VARIABLES[var]
         name_numeric = name + "_numeric"
         labs[name_numeric] = var
-
-        # Create bins for the variable
         var_column = VARNAMES_TO_DATASET[var]
-        data[name] = pd.cut(data[var_column], bins=10,
-                            precision=1, duplicates="drop")
-        data[name_numeric] = data[name].cat.codes
-
-        # Adjust tick labels for non-negative variables to remove negative ranges
-        if non_negative:
-            ticktext = [str(interval)
-                        for interval in data[name].cat.categories]
-            tokens = ticktext[0].split(",")
-            tokens[0] = "(0.0"
-            new_interval = ",".join(tokens)
-            ticktext[0] = new_interval
-        else:
-            ticktext = [str(interval)
-                        for interval in data[name].cat.categories]
 
         # Add dimension to the parallel coordinates plot
         if binning:
+            if bins is not None:
+                column_bins = bins[var_column]
+                codes = column_bins["codes"][data.index.to_numpy()]
+            else:
+                column_bins = compute_bins(data[var_column], non_negative)
+                codes = column_bins["codes"]
             dims.append({
                 "label": f"{var} ({unit})",
-                "values": data[name_numeric],
-                "tickvals": list(range(len(data[name].cat.categories))),
-                "ticktext": ticktext
+                "values": codes,
+                "tickvals": list(range(len(column_bins["ticktext"]))),
+                "ticktext": column_bins["ticktext"]
             })
         else:
             dims.append({
@@ -173,12 +197,28 @@ def make_bins(var, data, dims, labs, binning):
         return None
 
 
-def parallel_plot(data, selected_vars, binning):
+def aggregate_lines(dims):
+    """
+    Collapses the incidents that share the same value on every dimension into a single line.
+    :param dims: (list) The dimensions of the parallel plot, with one value per incident.
+    :return: (tuple) The dimensions with one value per distinct line, and the number of incidents of every line.
+             Lines are sorted by increasing count, so the heaviest ones are drawn on top.
+    """
+    frame = pd.DataFrame({i: np.asarray(dim["values"]) for i, dim in enumerate(dims)})
+    counts = frame.groupby(list(frame.columns), dropna=False, sort=False).size().sort_values(kind='stable')
+    lines = counts.index.to_frame(index=False)
+    return [dict(dim, values=lines[i].to_numpy()) for i, dim in enumerate(dims)], counts.to_numpy()
+
+
+def parallel_plot(data, selected_vars, binning, catalog=None, bins=None, aggregate=False):
     """
     Create a parallel coordinates plot based on the selected variables.
     :param data: The dataset to use for the plot
     :param selected_vars: The selected variables to plot
     :param binning: Whether to bin the continuous variables
+    :param catalog: The statistics catalog of the dataset; if given, the color scale spans the whole dataset
+    :param bins: The bins of the whole dataset, see get_bins; if None, the data is binned on its own
+    :param aggregate: Whether to draw one line per distinct combination of values, colored by its number of incidents
     :return: The parallel coordinates plot
     """
     dims = []
@@ -187,7 +227,28 @@ def parallel_plot(data, selected_vars, binning):
     # Process each selected variable: create bins for continuous variables and add dimensions
     for var in selected_vars:
         if var != "-- empty --":
-            make_bins(var, data, dims, labs, binning)
+            make_bins(var, data, dims, labs, binning, bins)
+
+    if aggregate and dims:
+        dims, counts = aggregate_lines(dims)
+        fig = go.Figure(data=go.Parcoords(
+            line=dict(
+                color=counts,
+                colorscale="Viridis",
+                showscale=True,
+                cmin=1,
+                cmax=max(int(counts.max()), 1) if len(counts) > 0 else 1,
+                colorbar=dict(
+                    title=dict(text="Incidents per line", font=dict(size=14, color="black")),
+                    tickfont=dict(size=12, color="black")
+                )
+            ),
+            dimensions=dims,
+            labelfont=dict(size=14, color="black"),
+            tickfont=dict(size=12, color="black")
+        ))
+        fig.update_layout(margin=dict(l=100, r=50, t=50, b=50))
+        return fig
 
     # Determine the first variable for coloring
     if selected_vars and selected_vars[0] != "-- empty --":
@@ -197,6 +258,10 @@ def parallel_plot(data, selected_vars, binning):
     else:
         color_column = None
 
+    color_range = column_bounds(catalog, color_column) if catalog is not None and color_column else None
+    if color_range is None and color_column:
+        color_range = [data[color_column].min(), data[color_column].max()]
+
     # Create the parallel coordinates plot
     fig = go.Figure(data=go.Parcoords(
         line=dict(
@@ -204,12 +269,11 @@ def parallel_plot(data, selected_vars, binning):
             len(data),  # Default to black if no variable
             colorscale="Viridis",
             showscale=True,  # Show the color bar
-            cmin=data[color_column].min() if color_column else 0,
-            cmax=data[color_column].max() if color_column else 1,
+            cmin=color_range[0] if color_column else 0,
+            cmax=color_range[1] if color_column else 1,
             colorbar=dict(
-                title=f"{first_var} (Scale)",  # Dynamic colorbar title
-                tickfont=dict(size=12, color="black"),
-                titlefont=dict(size=14, color="black")
+                title=dict(text=f"{first_var} (Scale)", font=dict(size=14, color="black")),  # Dynamic colorbar title
+                tickfont=dict(size=12, color="black")
             )
         ),
         dimensions=dims,
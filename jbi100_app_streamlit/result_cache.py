@@ -0,0 +1,112 @@
+import logging
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from plotly.basedatatypes import BaseFigure
+from config import RESULT_CACHE_BUDGET
+
+logger = logging.getLogger(__name__)
+
+
+def new_result_cache(budget):
+    """
+    Creates an empty LRU cache of query results with a memory budget.
+    :param budget: (int) The maximum number of bytes held by the cached results.
+    :return: (dict) The cache.
+    """
+    return {
+        "entries": OrderedDict(),  # key -> (value, bytes), least recently used first
+        "budget": budget,
+        "bytes": 0,
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "lock": threading.Lock(),
+    }
+
+
+def result_size(value):
+    """
+    Estimates the memory held by a cached result.
+    :param value: The result: an array, a DataFrame or Series, a figure, or a container of those.
+    :return: (int) The estimated number of bytes.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, BaseFigure):
+        return result_size(value.to_plotly_json())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def cached_result(cache, key, compute):
+    """
+    Returns the cached result for a key, computing and caching it on a miss.
+    Least recently used results are evicted until the cache fits its budget; a result larger
+    than the whole budget is returned without being cached.
+    :param cache: (dict) The cache, see new_result_cache.
+    :param key: The hashable key of the result, e.g. the dataset version and a normalized filter spec.
+    :param compute: (callable) Computes the result on a miss. Cached results are shared and must not be modified.
+    :return: The result.
+    """
+    with cache["lock"]:
+        if key in cache["entries"]:
+            cache["entries"].move_to_end(key)
+            cache["hits"] += 1
+            return cache["entries"][key][0]
+        cache["misses"] += 1
+
+    value = compute()
+    size = result_size(value)
+
+    with cache["lock"]:
+        if size > cache["budget"] or key in cache["entries"]:
+            return value
+        while cache["bytes"] + size > cache["budget"]:
+            _, (_, evicted_size) = cache["entries"].popitem(last=False)
+            cache["bytes"] -= evicted_size
+            cache["evictions"] += 1
+        cache["entries"][key] = (value, size)
+        cache["bytes"] += size
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Result cache miss (%s): %s", key[0], cache_stats(cache))
+    return value
+
+
+def cache_stats(cache):
+    """
+    Returns the counters of a cache.
+    :param cache: (dict) The cache, see new_result_cache.
+    :return: (dict) The number of hits, misses, evictions and entries, and the bytes used out of the budget.
+    """
+    with cache["lock"]:
+        return {
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "evictions": cache["evictions"],
+            "entries": len(cache["entries"]),
+            "bytes": cache["bytes"],
+            "budget": cache["budget"],
+        }
+
+
+@st.cache_resource
+def get_result_cache():
+    """
+    Returns the result cache shared by all sessions of the process.
+    Keys include the dataset version, so results of an older dataset are never returned and age out of the cache.
+    :return: (dict) The cache.
+    """
+    return new_result_cache(RESULT_CACHE_BUDGET)
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Resolutions of the time buckets, each bucket identified by an integer key:
+# days and weeks (starting on Monday) since the epoch, year * 12 + month - 1, and the year
+TIME_RESOLUTIONS = ['day', 'week', 'month', 'year']
+
+
+def bucket_keys(datetimes, resolution):
+    """
+    Returns the key of the time bucket of every datetime.
+    :param datetimes: (pd.Series) The datetimes.
+    :param resolution: (str) One of TIME_RESOLUTIONS.
+    :return: (np.ndarray) The int64 keys, -1 where the datetime is missing.
+    """
+    values = datetimes.to_numpy(dtype='datetime64[ns]')
+    missing = np.isnat(values)
+    if resolution in ('day', 'week'):
+        keys = values.astype('datetime64[D]').view('int64')
+        if resolution == 'week':
+            keys = (keys + 3) // 7  # 1970-01-01 was a Thursday
+    else:
+        months = values.astype('datetime64[M]').view('int64')  # Months since 1970-01
+        keys = months + 1970 * 12 if resolution == 'month' else months // 12 + 1970
+    return np.where(missing, -1, keys)
+
+
+def bucket_starts(keys, resolution):
+    """
+    Returns the start of the time buckets with the given keys.
+    :param keys: (np.ndarray) The bucket keys.
+    :param resolution: (str) One of TIME_RESOLUTIONS.
+    :return: (pd.DatetimeIndex) The first instant of every bucket.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    if resolution == 'day':
+        return pd.to_datetime(keys, unit='D')
+    if resolution == 'week':
+        return pd.to_datetime(keys * 7 - 3, unit='D')
+    months = keys - 1970 * 12 if resolution == 'month' else (keys - 1970) * 12
+    return pd.DatetimeIndex(months.astype('datetime64[M]').astype('datetime64[ns]'))
+
+
+def build_time_buckets(datetimes):
+    """
+    Precomputes the time bucket of every row at every resolution, as compact codes relative to the
+    first bucket so that per-bucket counts are a single bincount.
+    :param datetimes: (pd.Series) The datetime of every row, in dataset order.
+    :return: (dict) For every resolution, the int32 "codes" of the rows (-1 where missing), the key of
+             code 0 ("origin") and the number of buckets ("size").
+    """
+    buckets = {}
+    for resolution in TIME_RESOLUTIONS:
+        keys = bucket_keys(datetimes, resolution)
+        valid = keys >= 0
+        origin = int(keys[valid].min()) if valid.any() else 0
+        size = int(keys[valid].max()) - origin + 1 if valid.any() else 0
+        buckets[resolution] = {
+            "codes": np.where(valid, keys - origin, -1).astype(np.int32),
+            "origin": origin,
+            "size": size,
+        }
+    return buckets
+
+
+def bucket_counts(buckets, resolution, rows=None):
+    """
+    Counts rows per time bucket.
+    :param buckets: (dict) The time buckets, see build_time_buckets.
+    :param resolution: (str) One of TIME_RESOLUTIONS.
+    :param rows: (np.ndarray) The row numbers to count, or None to count every row.
+    :return: (tuple) The keys of the non-empty buckets and their counts.
+    """
+    resolution_buckets = buckets[resolution]
+    codes = resolution_buckets["codes"] if rows is None else resolution_buckets["codes"][rows]
+    counts = np.bincount(codes[codes >= 0], minlength=resolution_buckets["size"])
+    non_empty = np.flatnonzero(counts)
+    return non_empty + resolution_buckets["origin"], counts[non_empty]
+
+
+def row_keys(buckets, resolution):
+    """
+    Returns the key of the time bucket of every row, from the precomputed codes.
+    :param buckets: (dict) The time buckets, see build_time_buckets.
+    :param resolution: (str) One of TIME_RESOLUTIONS.
+    :return: (np.ndarray) The int64 keys, -1 where the datetime is missing.
+    """
+    codes = buckets[resolution]["codes"]
+    return np.where(codes >= 0, codes.astype(np.int64) + buckets[resolution]["origin"], -1)
@@ -0,0 +1,54 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The app modules import each other by their flat names, as when Streamlit runs jbi100_app_streamlit/app.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jbi100_app_streamlit'))
+
+from constants import STATE_CODES  # noqa: E402
+from dataset import compact_frame  # noqa: E402
+
+
+def synthetic_incidents(size, seed=0):
+    """
+    Generates a dataset shaped like the cleaned railroad incidents, compacted like the app loads it.
+    :param size: (int) The number of incidents.
+    :param seed: (int) The seed of the random generator.
+    :return: (pd.DataFrame) The incidents.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2019-01-01').value
+    end = pd.Timestamp('2023-12-31 23:59').value
+    datetimes = pd.to_datetime(np.sort(rng.integers(start, end, size)))
+
+    def with_missing(values, ratio=0.05):
+        values = values.astype('float64')
+        values[rng.random(size) < ratio] = np.nan
+        return values
+
+    data = pd.DataFrame({
+        'DATETIME': datetimes,
+        'YEAR': datetimes.year,
+        'MONTH': datetimes.month,
+        'DAY': datetimes.day,
+        'Latitude': rng.uniform(25, 49, size),
+        'Longitude': rng.uniform(-124, -67, size),
+        'STATE': rng.choice(list(STATE_CODES), size),
+        'TYPE': rng.integers(1, 14, size),
+        'VISIBLTY': with_missing(rng.integers(1, 5, size)),
+        'WEATHER': with_missing(rng.integers(1, 7, size)),
+        'TYPTRK': rng.integers(1, 5, size),
+        'TEMP': with_missing(rng.integers(-20, 100, size)),
+        'TRNSPD': with_missing(rng.integers(0, 80, size)),
+        'ACCDMG': rng.exponential(50000, size).round(),
+        'TOTINJ': rng.poisson(0.2, size),
+        'TOTKLD': rng.poisson(0.05, size),
+    })
+    return compact_frame(data)[0]
+
+
+@pytest.fixture
+def incidents():
+    return synthetic_incidents
@@ -0,0 +1,78 @@
+import math
+import pandas as pd
+import pytest
+from catalog import build_catalog
+from constants import STATE_CODES, TYPE_DESCRIPTIONS, VIS_DESCRIPTIONS, WEATHER_DESCRIPTIONS, TRACK_DESCRIPTIONS
+from cube import build_cube, filtered_rollup
+from filter_engine import build_filter_index, day_bounds, query_mask
+from time_buckets import build_time_buckets, row_keys
+
+
+def default_spec(catalog, start_date=None, end_date=None):
+    """The filter spec of setup_filters with its widgets left at their defaults, optionally with other dates."""
+    stats = catalog['columns']
+
+    def full_range(column):
+        return int(math.floor(stats[column]['min'])), int(math.ceil(stats[column]['max']))
+
+    return {
+        "ranges": {
+            "DATETIME": day_bounds(start_date or stats['DATETIME']['min'].date(), end_date or stats['DATETIME']['max'].date()),
+            "TEMP": full_range('TEMP'),
+            "TRNSPD": full_range('TRNSPD'),
+            "ACCDMG": (0, int(math.ceil(stats['ACCDMG']['max']))),
+            "TOTKLD": full_range('TOTKLD'),
+            "TOTINJ": (0, int(math.ceil(stats['TOTINJ']['max']))),
+        },
+        "codes": {
+            "TYPE": [int(code) for code in TYPE_DESCRIPTIONS],
+            "VISIBLTY": [int(code) for code in VIS_DESCRIPTIONS],
+            "WEATHER": [int(code) for code in WEATHER_DESCRIPTIONS],
+            "TYPTRK": [int(code) for code in TRACK_DESCRIPTIONS],
+            "STATE": list(STATE_CODES),
+        },
+    }
+
+
+def rollup_from_cube(data, spec, dimensions, measure=None):
+    index = build_filter_index(data)
+    mask = query_mask(index, spec)
+    month_keys = row_keys(build_time_buckets(data['DATETIME']), 'month')
+    return mask, filtered_rollup(build_cube(data), index, spec, data, mask, month_keys, dimensions, measure)
+
+
+def expected_rollup(data, mask, dimensions, measure=None):
+    selected = data[mask].copy()
+    selected['YM'] = selected['DATETIME'].dt.year * 12 + selected['DATETIME'].dt.month - 1
+    grouped = selected.dropna(subset=dimensions).groupby(dimensions)
+    expected = grouped.size().rename('Counts') if measure is None else grouped[measure].mean()
+    return expected.reset_index().astype({dimension: 'int64' for dimension in dimensions})
+
+
+def test_default_filters_hit_the_cube(incidents):
+    data = incidents(5000)
+    spec = default_spec(build_catalog(data))
+
+    mask, grouped = rollup_from_cube(data, spec, ['TYPE'])
+
+    assert grouped is not None
+    # The default date range ends on the day of the last incident, which must not be dropped
+    assert grouped['Counts'].sum() == mask.sum()
+    pd.testing.assert_frame_equal(grouped.reset_index(drop=True), expected_rollup(data, mask, ['TYPE']), check_dtype=False)
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    ('2020-03-17', '2021-08-04'),  # Partial months at both ends
+    ('2020-03-01', '2020-03-31'),  # Exactly one month
+    ('2020-03-10', '2020-03-20'),  # Within a single month
+])
+def test_partial_months_are_topped_up(incidents, start_date, end_date):
+    data = incidents(5000)
+    spec = default_spec(build_catalog(data), pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date())
+    spec["codes"]["WEATHER"] = [1, 2]
+
+    for dimensions, measure in [(['YM'], None), (['WEATHER'], 'TEMP'), (['YM', 'TYPE'], 'ACCDMG')]:
+        mask, grouped = rollup_from_cube(data, spec, dimensions, measure)
+        assert grouped is not None
+        pd.testing.assert_frame_equal(grouped.reset_index(drop=True), expected_rollup(data, mask, dimensions, measure),
+                                      check_dtype=False)
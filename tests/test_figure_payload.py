@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import streamlit as st
+from config import GRID_CELL_PIXELS, MAP_CONFIGS
+from constants import plot_bar_chart, plot_year_month_heatmap
+from cube import build_cube, rollup
+from figure_payload import payload_report
+from map_layers import grid_cell_size
+from map_visualization import add_cell_layer, create_base_figure, marker_properties_selected
+
+# Rows of the smaller dataset; every figure is also built from ten times as many rows
+ROWS = 5000
+
+# Growth allowed between the payloads of both datasets, for numbers printed with more digits
+PAYLOAD_SLACK = 4096
+
+
+def cube_rollup(data, dimensions, measure=None):
+    cube = build_cube(data)
+    return rollup(cube, np.ones(len(cube["counts"]), dtype=bool), dimensions, measure)
+
+
+def bar_figure(data):
+    return plot_bar_chart(None, "💥 Incident Type", "💸 Total Damage Costs",
+                          grouped=cube_rollup(data, ['TYPE'], 'ACCDMG'))
+
+
+def heatmap_figure(data):
+    return plot_year_month_heatmap(None, "🗓️ Date", "🔢 Number of Accidents", grouped=cube_rollup(data, ['YM']))
+
+
+def grid_figure(data):
+    st.session_state.map_layers = []
+    fig = create_base_figure()
+    cell_size = grid_cell_size(MAP_CONFIGS["Continental USA"]["zoom_level"], GRID_CELL_PIXELS)
+    add_cell_layer(fig, data, np.arange(len(data)), marker_properties_selected(), marker_properties_selected(),
+                   "Selected", cell_size)
+    return fig
+
+
+@pytest.mark.parametrize("build_figure", [bar_figure, heatmap_figure, grid_figure])
+def test_aggregated_payloads_do_not_grow_with_the_rows(incidents, build_figure):
+    small = payload_report(build_figure(incidents(ROWS)))
+    large = payload_report(build_figure(incidents(10 * ROWS, seed=1)))
+
+    for encoding in ["lists_bytes", "typed_bytes"]:
+        assert large[encoding] <= small[encoding] + PAYLOAD_SLACK
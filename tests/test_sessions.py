@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+from streamlit.runtime import Runtime
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest, app_test
+from catalog import build_catalog
+from result_cache import cache_stats, get_result_cache
+
+# Sessions run at the same time, each changing its filters and map selection this many times
+SESSIONS = 4
+ROUNDS = 6
+
+# Temperature ranges picked by the sessions, few enough that they share results in the result cache
+TEMPERATURE_RANGES = [(-20, 10), (0, 40), (30, 60), (50, 99)]
+
+
+@pytest.fixture
+def shared_runtime(monkeypatch):
+    """
+    Keeps one test runtime in place while sessions run at the same time. Every AppTest run installs its own
+    runtime and removes it when done, which would pull it away from the scripts still running in other sessions,
+    so AppTest is given a runtime class of its own to do that on.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    monkeypatch.setattr(Runtime, "_instance", runtime)
+    monkeypatch.setattr(app_test, "Runtime", type("AppTestRuntime", (Runtime,), {"_instance": None}))
+
+
+def linked_session(data, version, catalog):
+    """A page holding the sidebar filters and the map selection of the app, with the selected points set by the test."""
+    import streamlit as st
+    from crossfilter import passing_rows
+    from filters import setup_filters
+    from map_visualization import apply_map_selection, get_crossfilter, update_linked_filters
+
+    st.session_state.map_data = data
+    st.session_state.data_version = version
+    selected_filter = setup_filters(data, version, catalog)
+    update_linked_filters(selected_filter)
+    if 'test_points' in st.session_state:
+        apply_map_selection(data, st.session_state.pop('test_points'))
+    st.session_state.filtered_rows = passing_rows(get_crossfilter(), exclude=["map"])
+
+
+def run_rounds(session, number, barrier, data, default_rows):
+    """
+    Changes the temperature filter and the map selection of a session in a loop, every round starting
+    together with the other sessions, and checks that the session only ever reflects its own inputs.
+    """
+    temperatures = data['TEMP'].to_numpy()
+    for round_number in range(ROUNDS):
+        low, high = TEMPERATURE_RANGES[(number + round_number) % len(TEMPERATURE_RANGES)]
+        rows = [100 * number + round_number, 100 * number + round_number + 50]
+        next(slider for slider in session.slider if slider.label == "Temperature Range (F)").set_value((low, high))
+        session.session_state['test_points'] = [{"customdata": [row], "curve_number": 0} for row in rows]
+
+        barrier.wait()
+        try:
+            session.run()
+            assert not session.exception
+            assert np.array_equal(session.session_state['map_selection'], rows)
+            in_range = (temperatures[default_rows] >= low) & (temperatures[default_rows] <= high)
+            assert np.array_equal(session.session_state['filtered_rows'], default_rows[in_range])
+        except Exception:
+            # Release the other sessions instead of leaving them waiting for this one
+            barrier.abort()
+            raise
+
+
+def test_concurrent_sessions_keep_their_own_view_state(incidents, shared_runtime):
+    data = incidents(5000)
+    version = ('sessions', len(data))
+    catalog = build_catalog(data)
+
+    sessions = [AppTest.from_function(linked_session, args=(data, version, catalog), default_timeout=60)
+                for _ in range(SESSIONS)]
+    for session in sessions:
+        session.run()
+        assert not session.exception
+    default_rows = sessions[0].session_state['filtered_rows'].copy()
+    hits = cache_stats(get_result_cache())["hits"]
+
+    barrier = threading.Barrier(SESSIONS, timeout=60)
+    with ThreadPoolExecutor(SESSIONS) as executor:
+        futures = [executor.submit(run_rounds, session, number, barrier, data, default_rows)
+                   for number, session in enumerate(sessions)]
+        errors = [future.exception() for future in futures]
+    # Sessions released by a failing one report a broken barrier, the failure itself is raised first
+    errors = sorted((error for error in errors if error is not None),
+                    key=lambda error: isinstance(error, threading.BrokenBarrierError))
+    if errors:
+        raise errors[0]
+
+    # The sessions answered each other's filters from the shared result cache
+    assert cache_stats(get_result_cache())["hits"] > hits